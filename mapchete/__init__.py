@@ -1,6 +1,7 @@
 """Main module managing processes."""
 
 import os
+import hashlib
 import py_compile
 import logging
 import logging.config
@@ -12,16 +13,22 @@ import threading
 import numpy as np
 import numpy.ma as ma
 from cachetools import LRUCache
+from collections import OrderedDict
 from copy import copy
-from itertools import chain
+from itertools import chain, izip
+from multiprocessing.pool import ThreadPool
 
 from mapchete import commons
 from mapchete.config import MapcheteConfig
-from mapchete.tile import BufferedTile
+from mapchete.tile import BufferedTile, TileIndex
 from mapchete.io import raster, vector
 
 LOGGER = logging.getLogger("mapchete")
 
+# user process modules already imported in this worker, keyed by file path
+_PROCESS_MODULES = {}
+_PROCESS_MODULES_LOCK = threading.Lock()
+
 
 class Mapchete(object):
     """
@@ -35,6 +42,9 @@ class Mapchete(object):
         Mapchete process configuration
     with_cache : bool
         cache processed output data in memory (default: False)
+    cache_size : integer
+        maximum size of cached output data in MB (default: use
+        process_cache_size from configuration)
 
     Attributes
     ----------
@@ -44,15 +54,18 @@ class Mapchete(object):
         process name
     with_cache : bool
         process output data cached in memory
-    process_tile_cache : LRUCache
-        cache object storing the output data (only if with_cache = True)
+    process_tile_cache : ProcessTileCache
+        cache object storing the output data and counting cache hits, misses
+        and evictions (only if with_cache = True)
     current_processed : dict
         process tiles currently processed (only if with_cache = True)
     process_lock : Lock
         lock object (only if with_cache = True)
+    input_prefetcher : InputPrefetcher
+        reads inputs of upcoming process tiles in the background
     """
 
-    def __init__(self, config, with_cache=False):
+    def __init__(self, config, with_cache=False, cache_size=None):
         """
         Initialize Mapchete processing endpoint.
 
@@ -62,12 +75,17 @@ class Mapchete(object):
             Mapchete process configuration
         with_cache : bool
             cache processed output data in memory (default: False)
+        cache_size : integer
+            maximum size of cached output data in MB (default: use
+            process_cache_size from configuration)
         """
         if isinstance(config, str):
             config = MapcheteConfig(config)
         assert isinstance(config, MapcheteConfig)
         self.config = config
         config.output
+        self.input_prefetcher = InputPrefetcher(
+            maxsize=self.config.prefetch_tiles)
         py_compile.compile(self.config.process_file, doraise=True)
         self.process_name = os.path.splitext(
             os.path.basename(self.config.process_file))[0]
@@ -76,11 +94,14 @@ class Mapchete(object):
         else:
             self.with_cache = with_cache
         if self.with_cache:
-            self.process_tile_cache = LRUCache(maxsize=32)
+            if cache_size is None:
+                cache_size = self.config.process_cache_size
+            self.process_tile_cache = ProcessTileCache(
+                maxsize=cache_size * 1024 * 1024)
             self.current_processes = {}
             self.process_lock = threading.Lock()
 
-    def get_process_tiles(self, zoom=None):
+    def get_process_tiles(self, zoom=None, skip_existing=False):
         """
         Return process tiles.
 
@@ -93,25 +114,58 @@ class Mapchete(object):
         zoom : integer
             zoom level process tiles should be returned from; if none is given,
             return all process tiles
+        skip_existing : bool
+            don't return tiles whose output already exists (default: False)
 
         Returns
         -------
         generator
             iterable of BufferedTile objects
         """
+        for tile_index in self.get_process_tile_indexes(
+            zoom=zoom, skip_existing=skip_existing
+        ):
+            yield self.config.process_pyramid.tile_from_index(tile_index)
+
+    def get_process_tile_indexes(self, zoom=None, skip_existing=False):
+        """
+        Return indexes of process tiles.
+
+        Same as ``get_process_tiles()`` but without creating tile objects.
+
+        Parameters
+        ----------
+        zoom : integer
+            zoom level process tiles should be returned from; if none is given,
+            return all process tiles
+        skip_existing : bool
+            don't return tiles whose output already exists (default: False)
+
+        Returns
+        -------
+        generator
+            iterable of TileIndex objects
+        """
         try:
             if zoom or zoom == 0:
                 assert isinstance(zoom, int)
-                for tile in self.config.process_pyramid.tiles_from_geom(
-                    self.config.process_area(zoom), zoom
-                ):
-                    yield tile
+                zoom_levels = [zoom]
             else:
-                for zoom in reversed(self.config.zoom_levels):
-                    for tile in self.config.process_pyramid.tiles_from_geom(
-                        self.config.process_area(zoom), zoom
+                zoom_levels = reversed(self.config.zoom_levels)
+            pyramid = self.config.process_pyramid
+            for zoom in zoom_levels:
+                if skip_existing:
+                    self.config.output.scan_existing_tiles(zoom)
+                rows, cols = pyramid.tile_indexes_from_geom(
+                    self.config.process_area(zoom), zoom)
+                for row, col in izip(rows, cols):
+                    tile_index = TileIndex(zoom, int(row), int(col))
+                    if skip_existing and (
+                        self.config.output.tiles_exist_from_index(
+                            tile_index, pyramid)
                     ):
-                        yield tile
+                        continue
+                    yield tile_index
         except Exception:
             LOGGER.error(
                 "error getting work tiles: %s" % traceback.print_exc())
@@ -151,6 +205,34 @@ class Mapchete(object):
         except ImportError:
             raise
 
+    def prefetch(self, process_tile):
+        """
+        Start reading inputs of a process tile to be executed soon.
+
+        Inputs are opened and read in a background thread, so reading can
+        overlap with executing the current tile. The next ``execute()`` of
+        this tile hands the read inputs on to the process. Nothing happens if
+        ``prefetch_tiles`` is not configured or if the tile gets interpolated
+        from baselevels.
+
+        Parameters
+        ----------
+        process_tile : BufferedTile
+            Member of the process tile pyramid
+        """
+        if not self.input_prefetcher.maxsize or (
+            process_tile.zoom not in self.config.zoom_levels
+        ):
+            return
+        if self.config.baselevels and (
+            process_tile.zoom < min(self.config.baselevels["zooms"]) or
+            process_tile.zoom > max(self.config.baselevels["zooms"])
+        ):
+            return
+        self.input_prefetcher.prefetch(
+            process_tile,
+            self.config.at_zoom(process_tile.zoom)["input_files"])
+
     def read(self, output_tile):
         """
         Read from written process output.
@@ -290,10 +372,9 @@ class Mapchete(object):
         assert self.config.mode in ["memory", "continue", "overwrite"]
 
         # Extract Tile subset from process Tile and return.
-        try:
-            return self.process_tile_cache[process_tile.id]
-        except KeyError:
-            pass
+        cached = self.process_tile_cache.lookup(process_tile.id)
+        if cached is not None:
+            return cached
         # Lock process for Tile or wait.
         with self.process_lock:
             process_event = self.current_processes.get(process_tile.id)
@@ -302,20 +383,33 @@ class Mapchete(object):
         # Wait and return.
         if process_event:
             process_event.wait()
-            try:
-                return self.process_tile_cache[process_tile.id]
-            except KeyError:
-                raise RuntimeError("tile not in cache")
+            cached = self.process_tile_cache.lookup(process_tile.id)
+            if cached is not None:
+                return cached
+            # output was too large for cache or already evicted
+            return self.execute(process_tile)
         else:
             try:
                 output = self.execute(process_tile)
-                self.process_tile_cache[process_tile.id] = output
+                if self.config.output.METADATA["data_type"] == "raster":
+                    # cache data as one array, so extracting tiles from it
+                    # does not have to copy anything
+                    cached = copy(output)
+                    cached.data = raster.prepare_array(output.data)
+                else:
+                    cached = output
+                try:
+                    self.process_tile_cache[process_tile.id] = cached
+                except ValueError:
+                    LOGGER.warning((
+                        self.process_name, process_tile.id,
+                        "output too large for process tile cache"))
                 if self.config.mode in ["continue", "overwrite"]:
                     try:
                         self.write(output)
                     except OSError:
                         pass
-                return self.process_tile_cache[process_tile.id]
+                return output
             except:
                 raise
             finally:
@@ -326,10 +420,9 @@ class Mapchete(object):
                     process_event.set()
 
     def _extract(self, process_tile, tile):
-        try:
-            process_tile = self.process_tile_cache[process_tile.id]
-        except:
-            pass
+        if self.with_cache:
+            process_tile = self.process_tile_cache.get(
+                process_tile.id, process_tile)
         if self.config.output.METADATA["data_type"] == "raster":
             tile.data = raster.extract_from_tile(process_tile, tile)
         elif self.config.output.METADATA["data_type"] == "vector":
@@ -352,8 +445,8 @@ class Mapchete(object):
                 return self._streamline_output(process_data, process_tile)
         # Otherwise, load process source and execute.
         try:
-            new_process = imp.load_source(
-                self.process_name + "Process", self.config.process_file)
+            new_process = _load_process_module(
+                self.process_name, self.config.process_file)
             tile_process = new_process.Process(
                 config=self.config, tile=process_tile,
                 params=self.config.at_zoom(process_tile.zoom)
@@ -362,6 +455,10 @@ class Mapchete(object):
             raise
         except Exception as e:
             raise RuntimeError("error invoking process: %s" % e)
+        tile_process._prefetched_inputs = self.input_prefetcher.pop(
+            process_tile)
+        tile_process._opened_inputs = {}
+        tile_process._input_tiles = []
         try:
             starttime = time.time()
             message = "execute"
@@ -376,9 +473,17 @@ class Mapchete(object):
             elapsed = "%ss" % (round((endtime - starttime), 3))
             LOGGER.info((
                 self.process_name, process_tile.id, message, error, elapsed))
+            self.input_prefetcher.opened(tile_process._opened_inputs)
+            input_tiles = tile_process._input_tiles + [
+                input_tile
+                for _, input_tile in tile_process._prefetched_inputs.values()]
             del tile_process
         # Analyze proess output.
-        return self._streamline_output(process_data, process_tile)
+        process_tile = self._streamline_output(process_data, process_tile)
+        # read input data is reused for other tiles unless it is returned
+        for input_tile in input_tiles:
+            input_tile.release(keep=process_tile.data)
+        return process_tile
 
     def _streamline_output(self, process_data, process_tile):
         if isinstance(process_data, str):
@@ -430,6 +535,317 @@ class Mapchete(object):
         return process_data
 
 
+class ProcessTileCache(LRUCache):
+    """
+    LRU cache for process tiles limited by the memory size of their data.
+
+    Parameters
+    ----------
+    maxsize : integer
+        maximum size of all cached tile data in bytes
+
+    Attributes
+    ----------
+    hits : integer
+        number of ``lookup()`` calls finding a tile
+    misses : integer
+        number of ``lookup()`` calls not finding a tile
+    evictions : integer
+        number of tiles removed to free space for new tiles
+    """
+
+    def __init__(self, maxsize):
+        """Initialize."""
+        LRUCache.__init__(self, maxsize=maxsize, getsizeof=_tile_data_size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # tiles are cached and looked up by multiple threads when serving
+        self._lock = threading.RLock()
+
+    def lookup(self, key):
+        """
+        Return cached tile and count the lookup as hit or miss.
+
+        Parameters
+        ----------
+        key : tuple
+            process tile ID
+
+        Returns
+        -------
+        tile : BufferedTile
+            cached tile or None if it is not cached
+        """
+        with self._lock:
+            tile = self.get(key)
+            if tile is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return tile
+
+    def __getitem__(self, key):
+        """Return cached tile."""
+        with self._lock:
+            return LRUCache.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        """Cache tile and evict least recently used tiles if necessary."""
+        with self._lock:
+            LRUCache.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        """Remove tile."""
+        with self._lock:
+            LRUCache.__delitem__(self, key)
+
+    def popitem(self):
+        """Remove least recently used tile and count eviction."""
+        with self._lock:
+            item = LRUCache.popitem(self)
+            self.evictions += 1
+            return item
+
+
+class InputPrefetcher(object):
+    """
+    Read inputs of upcoming process tiles in a background thread.
+
+    Inputs are opened and read tile by tile in one thread per worker process.
+    Once tiles were executed, only inputs opened by the process are read,
+    using the same parameters the process opened them with. Read inputs are
+    kept until they are popped for execution; if more tiles are prefetched
+    than allowed, the oldest ones get discarded. The thread is started on
+    first use and restarted in forked processes.
+
+    Parameters
+    ----------
+    maxsize : integer
+        maximum number of tiles whose inputs are kept (default: 0, i.e.
+        prefetching is disabled)
+
+    Attributes
+    ----------
+    maxsize : integer
+        maximum number of tiles whose inputs are kept
+    """
+
+    def __init__(self, maxsize=0):
+        """Initialize."""
+        self.maxsize = maxsize
+        self._pid = None
+        self._pool = None
+        self._prefetched = OrderedDict()
+        self._open_kwargs = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """Exclude thread pool, lock and inputs keyed by object IDs."""
+        return dict(maxsize=self.maxsize)
+
+    def __setstate__(self, state):
+        """Start without prefetched inputs."""
+        self.__init__(**state)
+
+    def prefetch(self, process_tile, input_files):
+        """
+        Start opening and reading inputs of a tile.
+
+        Parameters
+        ----------
+        process_tile : BufferedTile
+            Member of the process tile pyramid
+        input_files : dictionary
+            input files of tile zoom level as provided by configuration
+        """
+        if not self.maxsize:
+            return
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # thread of a pool inherited from a parent process is gone
+                self._pid = os.getpid()
+                self._pool = ThreadPool(1)
+                self._prefetched.clear()
+            if process_tile.id in self._prefetched:
+                return
+            while len(self._prefetched) >= self.maxsize:
+                self._prefetched.popitem(last=False)
+            self._prefetched[process_tile.id] = self._pool.apply_async(
+                _read_inputs,
+                (process_tile, input_files, dict(self._open_kwargs)))
+
+    def opened(self, open_kwargs):
+        """
+        Remember which inputs a process opened.
+
+        Parameters
+        ----------
+        open_kwargs : dictionary
+            driver specific parameters keyed by ``id()`` of the opened
+            ``InputData``
+        """
+        if self.maxsize:
+            self._open_kwargs.update(open_kwargs)
+
+    def pop(self, process_tile):
+        """
+        Return prefetched inputs of a tile and remove them.
+
+        Waits for the inputs if they are still being read.
+
+        Parameters
+        ----------
+        process_tile : BufferedTile
+            Member of the process tile pyramid
+
+        Returns
+        -------
+        inputs : dictionary
+            pairs of driver specific parameters and read ``InputTile``
+            keyed by ``id()`` of their ``InputData``; empty if the tile was
+            not prefetched
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return {}
+            result = self._prefetched.pop(process_tile.id, None)
+        if result is None:
+            return {}
+        return result.get()
+
+
+def _read_inputs(process_tile, input_files, open_kwargs):
+    """Open and read inputs, skipping inputs which cannot be read."""
+    inputs = {}
+    for input_data in _flatten_inputs(input_files):
+        # read all inputs until it is known which ones the process opens
+        if open_kwargs and id(input_data) not in open_kwargs:
+            continue
+        kwargs = open_kwargs.get(id(input_data), {})
+        try:
+            input_tile = input_data.open(process_tile, **kwargs)
+            data = input_tile.read()
+            # multiple raster bands are read lazily
+            if isinstance(data, types.GeneratorType):
+                list(data)
+        except Exception:
+            # the process gets to see the error when opening the input itself
+            LOGGER.debug(
+                "prefetching input of %s failed: %s", process_tile.id,
+                traceback.format_exc())
+            continue
+        inputs[id(input_data)] = (kwargs, input_tile)
+    return inputs
+
+
+def _flatten_inputs(input_files):
+    """Yield InputData objects of (grouped) input files."""
+    for input_data in input_files.values():
+        if isinstance(input_data, dict):
+            for grouped in _flatten_inputs(input_data):
+                yield grouped
+        elif input_data is not None:
+            yield input_data
+
+
+def _tile_data_size(process_tile):
+    """Return size of tile data in bytes (estimated for vector data)."""
+    data = process_tile.data
+    if isinstance(data, np.ndarray):
+        return _array_size(data)
+    elif isinstance(data, tuple):
+        return sum(_array_size(band) for band in data)
+    elif isinstance(data, list):
+        return sum(_feature_size(feature) for feature in data)
+    else:
+        return 0
+
+
+def _array_size(array):
+    if isinstance(array, ma.MaskedArray) and array.mask is not ma.nomask:
+        return array.nbytes + array.mask.nbytes
+    return array.nbytes
+
+
+def _feature_size(feature):
+    """Estimate memory of a GeoJSON-like feature by its coordinates."""
+    try:
+        geometry = feature["geometry"]
+        geometry = getattr(geometry, "__geo_interface__", geometry)
+        # two float64 values per coordinate plus a fixed feature overhead
+        return 16 * _coordinates_count(geometry["coordinates"]) + 512
+    except Exception:
+        return 512
+
+
+def _coordinates_count(coordinates):
+    if not coordinates:
+        return 0
+    elif isinstance(coordinates[0], (int, long, float)):
+        return 1
+    else:
+        return sum(_coordinates_count(part) for part in coordinates)
+
+
+def _load_process_module(process_name, process_file):
+    """
+    Return imported user process module.
+
+    The module is imported only once per worker and reused for every
+    following process tile. It gets reimported if both modification time and
+    content hash of the process file have changed, e.g. while developing a
+    process using ``mapchete serve``.
+
+    Parameters
+    ----------
+    process_name : string
+        process name
+    process_file : string
+        absolute path to process file
+
+    Returns
+    -------
+    process module : module
+    """
+    mtime = os.path.getmtime(process_file)
+    with _PROCESS_MODULES_LOCK:
+        cached = _PROCESS_MODULES.get(process_file)
+        if cached:
+            if cached["mtime"] != mtime:
+                file_hash = _file_hash(process_file)
+                if file_hash == cached["hash"]:
+                    cached["mtime"] = mtime
+                else:
+                    LOGGER.info((
+                        process_name, "process file changed", "reloading"))
+                    cached = None
+            else:
+                file_hash = cached["hash"]
+        else:
+            file_hash = _file_hash(process_file)
+        if cached:
+            cached["hits"] += 1
+            cached["saved"] += cached["load_time"]
+            LOGGER.debug((
+                process_name, "process module reused %s times" % cached[
+                    "hits"], "%ss import time saved" % round(
+                        cached["saved"], 3)))
+            return cached["module"]
+        starttime = time.time()
+        module = imp.load_source(process_name + "Process", process_file)
+        _PROCESS_MODULES[process_file] = dict(
+            module=module, mtime=mtime, hash=file_hash,
+            load_time=time.time() - starttime, hits=0, saved=0.0)
+        return module
+
+
+def _file_hash(path):
+    """Return MD5 hex digest of file content."""
+    with open(path, "rb") as src:
+        return hashlib.md5(src.read()).hexdigest()
+
+
 class MapcheteProcess(object):
     """
     Process class inherited by user process script.
@@ -476,6 +892,9 @@ class MapcheteProcess(object):
         self.tile_pyramid = tile.tile_pyramid
         self.params = params
         self.config = config
+        self._prefetched_inputs = {}
+        self._opened_inputs = {}
+        self._input_tiles = []
 
     def write(self, data, **kwargs):
         """Deprecated."""
@@ -509,14 +928,51 @@ class MapcheteProcess(object):
         Returns
         -------
         tiled input data : InputTile
-            reprojected input data within tile
-        """
-        if not isinstance(input_file, str):
-            return input_file.open(self.tile, **kwargs)
-        if input_file not in self.params["input_files"]:
-            raise ValueError(
-                "%s not found in config as input file" % input_file)
-        return self.params["input_files"][input_file].open(self.tile, **kwargs)
+            reprojected input data within tile; if the input was prefetched
+            using the same driver specific parameters, the already read input
+            is returned; read data may be reused for other tiles after this
+            tile is processed, so it has to be copied if it should be kept
+        """
+        if isinstance(input_file, str):
+            if input_file not in self.params["input_files"]:
+                raise ValueError(
+                    "%s not found in config as input file" % input_file)
+            input_file = self.params["input_files"][input_file]
+        self._opened_inputs[id(input_file)] = kwargs
+        prefetched = self._prefetched_inputs.pop(id(input_file), None)
+        if prefetched is not None and prefetched[0] == kwargs:
+            input_tile = prefetched[1]
+        else:
+            input_tile = input_file.open(self.tile, **kwargs)
+        self._input_tiles.append(input_tile)
+        return input_tile
+
+    def read_inputs(self, input_files, **kwargs):
+        """
+        Open and read multiple inputs at once.
+
+        Inputs are read concurrently if ``read_threads`` is configured.
+
+        Parameters
+        ----------
+        input_files : list
+            file identifiers from configuration file or file paths
+        kwargs : driver specific parameters (e.g. resampling)
+
+        Returns
+        -------
+        data : list
+            read data of each input in the same order; multiple raster bands
+            are returned as list
+        """
+        def _read(input_file):
+            data = self.open(input_file, **kwargs).read()
+            # consume generators within the reading thread
+            if isinstance(data, types.GeneratorType):
+                return list(data)
+            return data
+
+        return raster.READ_POOL.map(_read, input_files)
 
     def hillshade(
         self, elevation, azimuth=315.0, altitude=45.0, z=1.0, scale=1.0
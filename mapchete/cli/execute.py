@@ -2,20 +2,37 @@
 """Command line utility to execute a Mapchete process."""
 
 import os
+import time
 import argparse
-from functools import partial
+import traceback
+from collections import namedtuple, deque
 from multiprocessing import cpu_count
 from multiprocessing.pool import Pool
+from Queue import Queue, Empty
 import logging
 import logging.config
 from py_compile import PyCompileError
 
 from mapchete import Mapchete
 from mapchete.config import MapcheteConfig
+from mapchete.io import raster
 from mapchete.log import get_log_config
+from mapchete.tile import TileIndex
 
 LOGGER = logging.getLogger("mapchete")
 
+# Workers write their output themselves and only send back this small status
+# record instead of the whole tile data.
+ProcessInfo = namedtuple("ProcessInfo", "tile_id message error")
+
+# seconds between progress messages of a zoom level while it is processed
+PROGRESS_INTERVAL = 30
+
+# Mapchete object of a pool worker, passed once when the worker starts so
+# tasks only have to carry tile IDs and worker state like the tile index of
+# existing output persists between tasks.
+_WORKER_PROCESS = None
+
 
 def main(args=None):
     """Execute a Mapchete process."""
@@ -50,32 +67,27 @@ def main(args=None):
     if parsed.tile:
         tile = process.config.process_pyramid.tile(*tuple(parsed.tile))
         assert tile.is_valid()
-        _write_worker(process, _process_worker(process, tile))
+        _worker_init(process)
+        _process_worker(process, tile)
         LOGGER.info("1 tile iterated")
         return
 
     num_processed = 0
 
     LOGGER.info("starting process using %s worker(s)", multi)
-    f = partial(_process_worker, process)
 
-    for zoom in zoom_levels:
-        process_tiles = process.get_process_tiles(zoom)
-        pool = Pool(multi)
-        try:
-            for output in pool.imap_unordered(f, process_tiles, chunksize=1):
-                _write_worker(process, output)
-                num_processed += 1
-        except KeyboardInterrupt:
-            LOGGER.info("Caught KeyboardInterrupt, terminating workers")
-            pool.terminate()
-            break
-        except:
-            raise
-        finally:
-            pool.close()
-            pool.join()
-            process_tiles = None
+    # Tiles are submitted as soon as the tiles they depend on are written,
+    # so zoom levels overlap whenever baselevels allow it.
+    try:
+        for process_info in _process_tiles(
+            process, list(zoom_levels), multi,
+            skip_existing=process.config.mode == "continue"
+        ):
+            num_processed += 1
+    except KeyboardInterrupt:
+        LOGGER.info("Caught KeyboardInterrupt, terminating workers")
+    except:
+        raise
 
     LOGGER.info("%s tile(s) iterated", (str(num_processed)))
 
@@ -90,8 +102,207 @@ def _get_zoom_level(zoom, process):
         return zoom
 
 
+def _process_tiles(process, zoom_levels, multi, skip_existing=False):
+    """
+    Process all tiles of all zoom levels using a dependency graph.
+
+    Tiles interpolated from baselevels depend on other process tiles: tiles
+    below the baselevels on their four children, tiles above on their
+    parent. Such a tile is submitted to the pool as soon as all of its
+    dependencies were written instead of waiting for the whole zoom level.
+
+    One worker pool is used for all zoom levels to keep workers and their
+    caches alive.
+
+    If ``prefetch_tiles`` is configured, ready tiles are submitted in
+    batches so a worker can read the inputs of its next tiles while
+    executing the current one.
+
+    Parameters
+    ----------
+    process : ``Mapchete``
+    zoom_levels : list
+        zoom levels to be processed in preferred order
+    multi : integer
+        number of worker processes
+    skip_existing : bool
+        don't submit tiles whose output already exists
+
+    Yields
+    ------
+    process info : ``ProcessInfo``
+    """
+    zoom_tiles = dict(
+        (zoom, list(
+            process.get_process_tile_indexes(
+                zoom, skip_existing=skip_existing)))
+        for zoom in zoom_levels)
+    for zoom in zoom_levels:
+        LOGGER.info(
+            "zoom %s: %s tile(s) to be processed", zoom, len(zoom_tiles[zoom]))
+    scheduled = set()
+    for tile_indexes in zoom_tiles.values():
+        scheduled.update(tile_indexes)
+    # count of unfinished dependencies per tile & tiles waiting for a tile
+    dependencies = {}
+    dependents = {}
+    ready = deque()
+    for zoom in zoom_levels:
+        for tile_index in zoom_tiles[zoom]:
+            tile_dependencies = [
+                dependency
+                for dependency in _tile_dependencies(process, tile_index)
+                if dependency in scheduled]
+            if tile_dependencies:
+                dependencies[tile_index] = len(tile_dependencies)
+                for dependency in tile_dependencies:
+                    dependents.setdefault(dependency, []).append(tile_index)
+            else:
+                ready.append(tile_index)
+    scheduled = None
+    zoom_stats = dict(
+        (zoom, dict(
+            total=len(tile_indexes), finished=0, start=None, logged=None))
+        for zoom, tile_indexes in zoom_tiles.iteritems())
+    zoom_tiles = None
+
+    # Workers are started only now so they inherit the output tile index
+    # which was built while looking for existing tiles.
+    pool = Pool(multi, _worker_init, (process, ))
+    max_batch_size = process.config.prefetch_tiles + 1
+    try:
+        finished = Queue()
+        submitted = []
+        while ready or submitted:
+            while ready and len(submitted) < multi * 2:
+                # don't let batches starve other workers of ready tiles
+                batch_size = max(1, min(max_batch_size, len(ready) // multi))
+                batch = [ready.popleft() for _ in range(batch_size)]
+                for tile_index in batch:
+                    stats = zoom_stats[tile_index.zoom]
+                    if stats["start"] is None:
+                        stats["start"] = stats["logged"] = time.time()
+                submitted.append(pool.apply_async(
+                    _dependency_worker, (batch, ), callback=finished.put))
+            # The callback only wakes up waiting, as failed tasks (e.g. if
+            # results cannot be pickled) never call back, all tasks are
+            # polled. A timeout keeps waiting interruptible by
+            # KeyboardInterrupt.
+            try:
+                finished.get(timeout=1)
+            except Empty:
+                pass
+            done = [result for result in submitted if result.ready()]
+            submitted = [result for result in submitted if result not in done]
+            for tile_index, process_info, error in _batch_results(done):
+                if error:
+                    raise RuntimeError(
+                        "processing tile %s failed:\n%s" % (
+                            tuple(tile_index), error))
+                # release tiles waiting for this tile, prefer them over others
+                for dependent in dependents.pop(tile_index, []):
+                    dependencies[dependent] -= 1
+                    if not dependencies[dependent]:
+                        del dependencies[dependent]
+                        ready.appendleft(dependent)
+                _log_zoom_progress(
+                    tile_index.zoom, zoom_stats[tile_index.zoom])
+                yield process_info
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _batch_results(results):
+    """Yield tile results of finished tasks, re-raise failed tasks."""
+    for result in results:
+        if not result.successful():
+            # raises the error of the task
+            result.get()
+        for tile_result in result.get():
+            yield tile_result
+
+
+def _tile_dependencies(process, tile_index):
+    """Return indexes of tiles which have to be processed before tile."""
+    baselevels = process.config.baselevels
+    if not baselevels:
+        return []
+    zoom, row, col = tile_index
+    if zoom < min(baselevels["zooms"]):
+        return [
+            TileIndex(zoom + 1, row * 2 + row_offset, col * 2 + col_offset)
+            for row_offset in (0, 1) for col_offset in (0, 1)]
+    elif zoom > max(baselevels["zooms"]):
+        return [TileIndex(zoom - 1, row // 2, col // 2)]
+    else:
+        return []
+
+
+def _log_zoom_progress(zoom, stats):
+    """
+    Log progress and throughput of a zoom level.
+
+    Progress is logged every ``PROGRESS_INTERVAL`` seconds and when all tiles
+    of the zoom level are processed.
+    """
+    stats["finished"] += 1
+    now = time.time()
+    elapsed = now - stats["start"]
+    if stats["finished"] == stats["total"]:
+        LOGGER.info(
+            "zoom %s: %s tile(s) processed in %ss (%s tiles/s)", zoom,
+            stats["total"], round(elapsed, 3),
+            round(stats["total"] / elapsed, 3) if elapsed else "-")
+    elif now - stats["logged"] >= PROGRESS_INTERVAL:
+        stats["logged"] = now
+        LOGGER.info(
+            "zoom %s: %s of %s tile(s) processed in %ss (%s tiles/s)", zoom,
+            stats["finished"], stats["total"], round(elapsed, 3),
+            round(stats["finished"] / elapsed, 3) if elapsed else "-")
+
+
+def _worker_init(process):
+    """Store Mapchete object in pool worker and apply per worker settings."""
+    global _WORKER_PROCESS
+    _WORKER_PROCESS = process
+    raster.DATASET_POOL.maxsize = process.config.dataset_pool_size
+    raster.READ_POOL.size = process.config.read_threads
+
+
+def _dependency_worker(tile_indexes):
+    """
+    Process batch of tiles and return errors instead of raising them.
+
+    Inputs of the following tiles are prefetched while a tile is executed.
+    Processing stops at the first error. For every processed tile, its index,
+    ``ProcessInfo`` and formatted error (or None) are returned.
+    """
+    process = _WORKER_PROCESS
+    results = []
+    try:
+        process_tiles = [
+            process.config.process_pyramid.tile_from_index(tile_index)
+            for tile_index in tile_indexes]
+        for process_tile in process_tiles[1:]:
+            process.prefetch(process_tile)
+        for tile_index, process_tile in zip(tile_indexes, process_tiles):
+            results.append(
+                (tile_index, _process_worker(process, process_tile), None))
+    except BaseException:
+        # Exceptions may not be picklable and other errors like SystemExit
+        # would end the worker without returning, so only send back text.
+        error = traceback.format_exc()
+        LOGGER.error(error)
+        results.append((tile_indexes[len(results)], None, error))
+    return results
+
+
 def _process_worker(process, process_tile):
-    """Worker function running the process."""
+    """Worker function running the process and writing its output."""
     # Skip execution if overwrite is disabled and tile exists
     if process.config.mode == "continue" and (
         process.config.output.tiles_exist(process_tile)
@@ -100,23 +311,18 @@ def _process_worker(process, process_tile):
         LOGGER.info((
             process.process_name, process_tile.id, process_tile.message,
             None, None))
-        return process_tile
+        return ProcessInfo(process_tile.id, process_tile.message, None)
     else:
         try:
-            return process.execute(process_tile)
+            output = process.execute(process_tile)
         except ImportError:
             raise
-        except Exception as e:
+        except Exception:
             process_tile.message = "error"
-            process_tile.error = e
-            return process_tile
-
-
-def _write_worker(process, process_tile):
-    """Worker function writing process outputs."""
-    if process_tile.message == "exists":
-        return
-    process.write(process_tile)
+            process_tile.error = traceback.format_exc()
+            output = process_tile
+        process.write(output)
+        return ProcessInfo(output.id, output.message, output.error)
 
 
 if __name__ == "__main__":
@@ -97,8 +97,9 @@ class MapcheteCLI(object):
             metavar="<int>", default=5000)
         parser.add_argument(
             "--internal_cache", "-c", type=int,
-            help="number of web tiles to be cached in RAM",
-            metavar="<int>", default=1024)
+            help="size of process output cached in RAM in MB (overrides \
+                process_cache_size from Mapchete file)",
+            metavar="<int>")
         parser.add_argument(
             "--zoom", "-z", type=int, nargs='*',
             help="either minimum and maximum zoom level or just one zoom level",
@@ -11,6 +11,7 @@ from flask import Flask, send_file, make_response, render_template_string
 
 from mapchete import Mapchete
 from mapchete.config import MapcheteConfig
+from mapchete.io import raster
 from mapchete.log import get_log_config
 from mapchete.tile import BufferedTilePyramid
 
@@ -36,8 +37,11 @@ def main(args=None):
         MapcheteConfig(
             parsed.mapchete_file, zoom=parsed.zoom, bounds=parsed.bounds,
             single_input_file=parsed.input_file, mode=_get_mode(parsed)),
-        with_cache=True
+        with_cache=True, cache_size=parsed.internal_cache
         )
+    # this process only serves this Mapchete process
+    raster.DATASET_POOL.maxsize = process.config.dataset_pool_size
+    raster.READ_POOL.size = process.config.read_threads
 
     app = Flask(__name__)
     web_pyramid = BufferedTilePyramid(process.config.raw["output"]["type"])
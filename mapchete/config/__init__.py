@@ -38,7 +38,13 @@ _RESERVED_PARAMETERS = [
     "process_bounds",  # process boundaries
     "metatiling",  # metatile size (for both process and output)
     "pixelbuffer",  # buffer around each tile in pixels
-    "baselevels"  # enable interpolation from other zoom levels
+    "baselevels",  # enable interpolation from other zoom levels
+    "dataset_pool_size",  # number of input datasets kept open per worker
+    "process_cache_size",  # MB of process output cached in memory
+    "warp_num_threads",  # number of GDAL threads per raster warp
+    "warp_mem_limit",  # GDAL warp memory limit in MB
+    "read_threads",  # threads reading bands, parts & inputs of a tile
+    "prefetch_tiles"  # upcoming tiles per worker whose inputs are prefetched
 ]
 
 
@@ -98,6 +104,22 @@ class MapcheteConfig(object):
         buffer around process tiles
     metatiling : integer
         process metatiling
+    dataset_pool_size : integer
+        maximum number of raster input datasets kept open per worker
+    process_cache_size : integer
+        maximum size of process output cached in memory in MB (only used in
+        memory mode or when serving a process)
+    warp_num_threads : integer
+        number of threads GDAL uses when warping raster inputs
+    warp_mem_limit : integer
+        GDAL warp memory limit in MB (0 uses the GDAL default)
+    read_threads : integer
+        number of threads reading bands, antimeridian parts and inputs of a
+        tile concurrently
+    prefetch_tiles : integer
+        number of upcoming tiles per worker whose inputs are read in the
+        background while the current tile is processed (0 disables
+        prefetching)
     """
 
     def __init__(
@@ -143,7 +165,7 @@ class MapcheteConfig(object):
         self.crs = self.process_pyramid.crs
         self._validate()
 
-    @property
+    @cached_property
     def output(self):
         """Output object of driver."""
         output_params = self.raw["output"]
@@ -259,6 +281,93 @@ class MapcheteConfig(object):
             higher=resampling_higher,
         )
 
+    @cached_property
+    def dataset_pool_size(self):
+        """Maximum number of raster input datasets kept open per worker."""
+        try:
+            dataset_pool_size = self.raw["dataset_pool_size"]
+        except KeyError:
+            return 16
+        try:
+            assert isinstance(dataset_pool_size, int)
+            assert dataset_pool_size > 0
+        except AssertionError:
+            raise ValueError("dataset_pool_size must be a positive integer")
+        return dataset_pool_size
+
+    @cached_property
+    def process_cache_size(self):
+        """Maximum size of cached process output in MB."""
+        try:
+            process_cache_size = self.raw["process_cache_size"]
+        except KeyError:
+            return 512
+        try:
+            assert isinstance(process_cache_size, int)
+            assert process_cache_size >= 0
+        except AssertionError:
+            raise ValueError(
+                "process_cache_size must be zero or a positive integer")
+        return process_cache_size
+
+    @cached_property
+    def warp_num_threads(self):
+        """Number of threads GDAL uses when warping raster inputs."""
+        try:
+            warp_num_threads = self.raw["warp_num_threads"]
+        except KeyError:
+            return 1
+        try:
+            assert isinstance(warp_num_threads, int)
+            assert warp_num_threads > 0
+        except AssertionError:
+            raise ValueError("warp_num_threads must be a positive integer")
+        return warp_num_threads
+
+    @cached_property
+    def warp_mem_limit(self):
+        """GDAL warp memory limit in MB."""
+        try:
+            warp_mem_limit = self.raw["warp_mem_limit"]
+        except KeyError:
+            return 0
+        try:
+            assert isinstance(warp_mem_limit, int)
+            assert warp_mem_limit >= 0
+        except AssertionError:
+            raise ValueError(
+                "warp_mem_limit must be zero or a positive integer")
+        return warp_mem_limit
+
+    @cached_property
+    def read_threads(self):
+        """Number of threads reading data of a tile concurrently."""
+        try:
+            read_threads = self.raw["read_threads"]
+        except KeyError:
+            return 1
+        try:
+            assert isinstance(read_threads, int)
+            assert read_threads > 0
+        except AssertionError:
+            raise ValueError("read_threads must be a positive integer")
+        return read_threads
+
+    @cached_property
+    def prefetch_tiles(self):
+        """Number of upcoming tiles per worker whose inputs are prefetched."""
+        try:
+            prefetch_tiles = self.raw["prefetch_tiles"]
+        except KeyError:
+            return 0
+        try:
+            assert isinstance(prefetch_tiles, int)
+            assert prefetch_tiles >= 0
+        except AssertionError:
+            raise ValueError(
+                "prefetch_tiles must be zero or a positive integer")
+        return prefetch_tiles
+
     @cached_property
     def pixelbuffer(self):
         """Buffer around process tiles."""
@@ -465,7 +574,9 @@ class MapcheteConfig(object):
                             os.path.join(self.config_dir, v))
                     self._prepared_files[lk] = load_input_reader(dict(
                         path=path, pyramid=self.process_pyramid,
-                        pixelbuffer=self.pixelbuffer))
+                        pixelbuffer=self.pixelbuffer,
+                        warp_num_threads=self.warp_num_threads,
+                        warp_mem_limit=self.warp_mem_limit))
                 # add file reader and file bounding box
                 input_files[k] = self._prepared_files[lk]
                 input_files_areas.append(input_files[k].bbox(
@@ -5,6 +5,7 @@ When writing a new driver, please inherit from these classes and implement the
 respective interfaces.
 """
 
+from shapely.prepared import prep
 from tilematrix import TilePyramid
 
 
@@ -41,6 +42,14 @@ class InputData(object):
         self.pixelbuffer = input_params["pixelbuffer"]
         self.crs = self.pyramid.crs
         self.srid = self.pyramid.srid
+        self._bbox_cache = {}
+        self._prepared_bbox = None
+
+    def __getstate__(self):
+        """Exclude prepared geometry which cannot be pickled."""
+        state = self.__dict__.copy()
+        state["_prepared_bbox"] = None
+        return state
 
     def open(self, tile, **kwargs):
         """
@@ -61,11 +70,49 @@ class InputData(object):
         """
         Return data bounding box.
 
+        The bounding box is determined by ``_bbox()`` only once per output
+        CRS.
+
         Parameters
         ----------
         out_crs : ``rasterio.crs.CRS``
             rasterio CRS object (default: CRS of process pyramid)
 
+        Returns
+        -------
+        bounding box : geometry
+            Shapely geometry object
+        """
+        assert self.pyramid
+        if out_crs is None:
+            out_crs = self.pyramid.crs
+        crs_key = out_crs.to_string()
+        if crs_key not in self._bbox_cache:
+            self._bbox_cache[crs_key] = self._bbox(out_crs)
+        return self._bbox_cache[crs_key]
+
+    def prepared_bbox(self):
+        """
+        Return prepared data bounding box in process CRS.
+
+        Returns
+        -------
+        bounding box : ``shapely.prepared.PreparedGeometry``
+            for fast intersection checks
+        """
+        if self._prepared_bbox is None:
+            self._prepared_bbox = prep(self.bbox())
+        return self._prepared_bbox
+
+    def _bbox(self, out_crs):
+        """
+        Determine data bounding box.
+
+        Parameters
+        ----------
+        out_crs : ``rasterio.crs.CRS``
+            rasterio CRS object
+
         Returns
         -------
         bounding box : geometry
@@ -119,6 +166,21 @@ class InputTile(object):
         """
         raise NotImplementedError
 
+    def release(self, keep=None):
+        """
+        Free resources used for reading once the process tile is done.
+
+        Data read before must not be used anymore afterwards, except for data
+        given as keep. Drivers without such resources don't have to
+        implement this.
+
+        Parameters
+        ----------
+        keep : array or list
+            data still in use, e.g. process output
+        """
+        pass
+
     def __enter__(self):
         """Required for 'with' statement."""
         return self
@@ -204,6 +266,42 @@ class OutputData(object):
         """
         raise NotImplementedError
 
+    def tiles_exist_from_index(self, tile_index, process_pyramid):
+        """
+        Check whether all output tiles of a process tile index exist.
+
+        Drivers which can check tiles by index should implement this, so no
+        process tile has to be created. By default, the process tile is
+        created and checked with ``tiles_exist()``.
+
+        Parameters
+        ----------
+        tile_index : ``TileIndex`` or tuple
+            zoom, row and col of process tile
+        process_pyramid : ``BufferedTilePyramid``
+            process tile pyramid
+
+        Returns
+        -------
+        exists : bool
+        """
+        return self.tiles_exist(process_pyramid.tile_from_index(tile_index))
+
+    def scan_existing_tiles(self, zoom):
+        """
+        Look up existing output tiles of a zoom level at once.
+
+        Called before process tiles are dispatched, so output tiles missing
+        at this point don't have to be checked one by one. Drivers without
+        such a lookup don't have to implement this.
+
+        Parameters
+        ----------
+        zoom : integer
+            zoom level
+        """
+        pass
+
     def is_valid_with_config(self, config):
         """
         Check if output format is valid with other process parameters.
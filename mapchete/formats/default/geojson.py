@@ -26,10 +26,13 @@ schema: key-value pairs
 import os
 import types
 import fiona
+from copy import copy
+from shapely.geometry import shape
 
-from mapchete.tile import BufferedTile
+from mapchete.tile import BufferedTile, intersecting_tile_indexes
 from mapchete.formats import base
 from mapchete.io.vector import write_vector_window
+from mapchete.io import makedirs, TileDirectoryIndex
 
 
 class OutputData(base.OutputData):
@@ -70,6 +73,8 @@ class OutputData(base.OutputData):
         super(OutputData, self).__init__(output_params)
         self.path = output_params["path"]
         self.file_extension = ".geojson"
+        self._existing_tiles = TileDirectoryIndex(
+            self.path, self.file_extension)
         self.output_params = output_params
 
     def read(self, output_tile):
@@ -101,21 +106,29 @@ class OutputData(base.OutputData):
         process_tile : ``BufferedTile``
             must be member of process ``TilePyramid``
         """
-        if not os.path.exists(self.path):
-            os.makedirs(self.path)
+        makedirs(self.path)
         if process_tile.data is None:
             return
         assert isinstance(process_tile.data, (list, types.GeneratorType))
         if isinstance(process_tile.data, types.GeneratorType):
             process_tile.data = list(process_tile.data)
+        # parse feature geometries only once for all output tiles
+        parsed_tile = copy(process_tile)
+        parsed_tile.data = [
+            dict(feature, geometry=shape(feature["geometry"]))
+            for feature in process_tile.data
+        ]
         # Convert from process_tile to output_tiles
-        for tile in self.pyramid.intersecting(process_tile):
-            # skip if file exists and overwrite is not set
-            out_path = self.get_path(tile)
-            self.prepare_path(tile)
-            out_tile = BufferedTile(tile, self.pixelbuffer)
+        for tile_index in intersecting_tile_indexes(
+            process_tile, self.pyramid
+        ):
+            out_tile = BufferedTile(
+                self.pyramid.tile(*tile_index), self.pixelbuffer)
+            out_path = self.get_path(out_tile)
+            self.prepare_path(out_tile)
+            self._existing_tiles.discard(tile_index)
             write_vector_window(
-                in_tile=process_tile, out_schema=self.output_params["schema"],
+                in_tile=parsed_tile, out_schema=self.output_params["schema"],
                 out_tile=out_tile, out_path=out_path)
 
     def tiles_exist(self, process_tile):
@@ -127,15 +140,45 @@ class OutputData(base.OutputData):
         process_tile : ``BufferedTile``
             must be member of process ``TilePyramid``
 
+        Returns
+        -------
+        exists : bool
+        """
+        return self.tiles_exist_from_index(
+            process_tile.id, process_tile.tile_pyramid)
+
+    def tiles_exist_from_index(self, tile_index, process_pyramid):
+        """
+        Check whether all output tiles of a process tile index exist.
+
+        Parameters
+        ----------
+        tile_index : ``TileIndex`` or tuple
+            zoom, row and col of process tile
+        process_pyramid : ``BufferedTilePyramid``
+            process tile pyramid
+
         Returns
         -------
         exists : bool
         """
         return all(
-            os.path.exists(self.get_path(tile))
-            for tile in self.pyramid.intersecting(process_tile)
+            self._existing_tiles.exists(output_index)
+            for output_index in intersecting_tile_indexes(
+                tile_index, self.pyramid, process_pyramid)
         )
 
+    def scan_existing_tiles(self, zoom):
+        """
+        Look up existing output tiles of a zoom level at once.
+
+        Parameters
+        ----------
+        zoom : integer
+            zoom level
+        """
+        self._existing_tiles.scan(zoom)
+
     def is_valid_with_config(self, config):
         """
         Check if output format is valid with other process parameters.
@@ -206,12 +249,7 @@ class OutputData(base.OutputData):
         tile : ``BufferedTile``
             must be member of output ``TilePyramid``
         """
-        zoomdir = os.path.join(self.path, str(tile.zoom))
-        if not os.path.exists(zoomdir):
-            os.makedirs(zoomdir)
-        rowdir = os.path.join(zoomdir, str(tile.row))
-        if not os.path.exists(rowdir):
-            os.makedirs(rowdir)
+        makedirs(os.path.join(self.path, str(tile.zoom), str(tile.row)))
 
     def empty(self, process_tile=None):
         """
@@ -36,8 +36,9 @@ import numpy.ma as ma
 import rasterio
 
 from mapchete.formats import base
-from mapchete.tile import BufferedTile
+from mapchete.tile import BufferedTile, intersecting_tile_indexes
 from mapchete.io.raster import write_raster_window
+from mapchete.io import makedirs, TileDirectoryIndex
 
 
 class OutputData(base.OutputData):
@@ -80,6 +81,8 @@ class OutputData(base.OutputData):
         super(OutputData, self).__init__(output_params)
         self.path = output_params["path"]
         self.file_extension = ".tif"
+        self._existing_tiles = TileDirectoryIndex(
+            self.path, self.file_extension)
         self.output_params = output_params
         try:
             self.nodata = output_params["nodata"]
@@ -115,17 +118,19 @@ class OutputData(base.OutputData):
         process_tile : ``BufferedTile``
             must be member of process ``TilePyramid``
         """
-        if not os.path.exists(self.path):
-            os.makedirs(self.path)
+        makedirs(self.path)
         self.verify_data(process_tile)
         process_tile.data = self.prepare_data(
             process_tile.data, self.profile(process_tile))
         # Convert from process_tile to output_tiles
-        for tile in self.pyramid.intersecting(process_tile):
-            # skip if file exists and overwrite is not set
-            out_path = self.get_path(tile)
-            self.prepare_path(tile)
-            out_tile = BufferedTile(tile, self.pixelbuffer)
+        for tile_index in intersecting_tile_indexes(
+            process_tile, self.pyramid
+        ):
+            out_tile = BufferedTile(
+                self.pyramid.tile(*tile_index), self.pixelbuffer)
+            out_path = self.get_path(out_tile)
+            self.prepare_path(out_tile)
+            self._existing_tiles.discard(tile_index)
             # write_from_tile(buffered_tile, profile, out_tile, out_path)
             write_raster_window(
                 in_tile=process_tile, out_profile=self.profile(out_tile),
@@ -140,15 +145,45 @@ class OutputData(base.OutputData):
         process_tile : ``BufferedTile``
             must be member of process ``TilePyramid``
 
+        Returns
+        -------
+        exists : bool
+        """
+        return self.tiles_exist_from_index(
+            process_tile.id, process_tile.tile_pyramid)
+
+    def tiles_exist_from_index(self, tile_index, process_pyramid):
+        """
+        Check whether all output tiles of a process tile index exist.
+
+        Parameters
+        ----------
+        tile_index : ``TileIndex`` or tuple
+            zoom, row and col of process tile
+        process_pyramid : ``BufferedTilePyramid``
+            process tile pyramid
+
         Returns
         -------
         exists : bool
         """
         return all(
-            os.path.exists(self.get_path(tile))
-            for tile in self.pyramid.intersecting(process_tile)
+            self._existing_tiles.exists(output_index)
+            for output_index in intersecting_tile_indexes(
+                tile_index, self.pyramid, process_pyramid)
         )
 
+    def scan_existing_tiles(self, zoom):
+        """
+        Look up existing output tiles of a zoom level at once.
+
+        Parameters
+        ----------
+        zoom : integer
+            zoom level
+        """
+        self._existing_tiles.scan(zoom)
+
     def is_valid_with_config(self, config):
         """
         Check if output format is valid with other process parameters.
@@ -197,12 +232,7 @@ class OutputData(base.OutputData):
         tile : ``BufferedTile``
             must be member of output ``TilePyramid``
         """
-        zoomdir = os.path.join(self.path, str(tile.zoom))
-        if not os.path.exists(zoomdir):
-            os.makedirs(zoomdir)
-        rowdir = os.path.join(zoomdir, str(tile.row))
-        if not os.path.exists(rowdir):
-            os.makedirs(rowdir)
+        makedirs(os.path.join(self.path, str(tile.zoom), str(tile.row)))
 
     def profile(self, tile):
         """
@@ -6,7 +6,6 @@ extended easily.
 """
 
 import os
-import rasterio
 import ogr
 from shapely.geometry import box
 from shapely.wkt import loads
@@ -15,7 +14,8 @@ from copy import deepcopy
 
 from mapchete.formats import base
 from mapchete.io.vector import reproject_geometry
-from mapchete.io.raster import read_raster_window
+from mapchete.io.raster import (
+    read_raster_window, DATASET_POOL, WARP_BUFFERS)
 
 
 class InputData(base.InputData):
@@ -31,6 +31,10 @@ class InputData(base.InputData):
     ----------
     path : string
         path to input file
+    num_threads : integer
+        default number of GDAL warp threads (process ``warp_num_threads``)
+    warp_mem_limit : integer
+        default GDAL warp memory limit in MB (process ``warp_mem_limit``)
     profile : dictionary
         rasterio metadata dictionary
     pixelbuffer : integer
@@ -54,11 +58,13 @@ class InputData(base.InputData):
         """Initialize."""
         super(InputData, self).__init__(input_params)
         self.path = input_params["path"]
+        self.num_threads = input_params.get("warp_num_threads")
+        self.warp_mem_limit = input_params.get("warp_mem_limit")
 
     @cached_property
     def profile(self):
         """Return raster metadata."""
-        with rasterio.open(self.path, "r") as src:
+        with DATASET_POOL.open(self.path) as src:
             return deepcopy(src.meta)
 
     def open(self, tile, **kwargs):
@@ -74,27 +80,12 @@ class InputData(base.InputData):
         input tile : ``InputTile``
             tile view of input data
         """
+        kwargs.setdefault("num_threads", self.num_threads)
+        kwargs.setdefault("warp_mem_limit", self.warp_mem_limit)
         return InputTile(tile, self, **kwargs)
 
-    def bbox(self, out_crs=None):
-        """
-        Return data bounding box.
-
-        Parameters
-        ----------
-        out_crs : ``rasterio.crs.CRS``
-            rasterio CRS object (default: CRS of process pyramid)
-
-        Returns
-        -------
-        bounding box : geometry
-            Shapely geometry object
-        """
-        assert self.path
-        assert self.pyramid
-        if out_crs is None:
-            out_crs = self.pyramid.crs
-        with rasterio.open(self.path) as inp:
+    def _bbox(self, out_crs):
+        with DATASET_POOL.open(self.path) as inp:
             inp_crs = inp.crs
             try:
                 assert inp_crs.is_valid
@@ -149,14 +140,25 @@ class InputTile(base.InputTile):
         path to input raster file
     resampling : string
         resampling method passed on to rasterio
+    num_threads : integer
+        number of GDAL warp threads (default: process ``warp_num_threads``)
+    warp_mem_limit : integer
+        GDAL warp memory limit in MB (default: process ``warp_mem_limit``)
     """
 
-    def __init__(self, tile, raster_file, resampling="nearest"):
+    def __init__(
+        self, tile, raster_file, resampling="nearest", num_threads=None,
+        warp_mem_limit=None
+    ):
         """Initialize."""
         self.tile = tile
         self.raster_file = raster_file
         self._np_band_cache = {}
+        # arrays from WARP_BUFFERS holding the cached bands
+        self._buffers = []
         self.resampling = resampling
+        self.num_threads = num_threads
+        self.warp_mem_limit = warp_mem_limit
 
     def read(self, indexes=None):
         """
@@ -181,11 +183,9 @@ class InputTile(base.InputTile):
         is empty : bool
         """
         band_indexes = self._get_band_indexes(indexes)
-        src_bbox = self.raster_file.bbox()
-        tile_geom = self.tile.bbox
 
         # empty if tile does not intersect with file bounding box
-        if not tile_geom.intersects(src_bbox):
+        if not self.raster_file.prepared_bbox().intersects(self.tile.bbox):
             return True
 
         # empty if source band(s) are empty
@@ -196,6 +196,22 @@ class InputTile(base.InputTile):
                 break
         return all_bands_empty
 
+    def release(self, keep=None):
+        """
+        Hand back arrays of read bands to be reused for other tiles.
+
+        Read bands must not be used anymore afterwards, except for data given
+        as keep.
+
+        Parameters
+        ----------
+        keep : array or list
+            data still in use, e.g. process output
+        """
+        self._np_band_cache = {}
+        buffers, self._buffers = self._buffers, []
+        WARP_BUFFERS.release(buffers, keep=keep)
+
     def _get_band_indexes(self, indexes=None):
         """Return valid band indexes."""
         if indexes:
@@ -209,20 +225,27 @@ class InputTile(base.InputTile):
     def _bands_from_cache(self, indexes=None):
         """Cache reprojected source data for multiple usage."""
         band_indexes = self._get_band_indexes(indexes)
-        for band_index in band_indexes:
-            if band_index not in self._np_band_cache:
-                band = read_raster_window(
-                    self.raster_file.path,
-                    self.tile,
-                    indexes=band_index,
-                    resampling=self.resampling
-                ).next()
+        # read all uncached bands at once
+        uncached = [
+            band_index for band_index in band_indexes
+            if band_index not in self._np_band_cache]
+        if uncached:
+            for band_index, band in zip(uncached, read_raster_window(
+                self.raster_file.path,
+                self.tile,
+                indexes=uncached,
+                resampling=self.resampling,
+                num_threads=self.num_threads,
+                warp_mem_limit=self.warp_mem_limit,
+                buffers=self._buffers
+            )):
                 self._np_band_cache[band_index] = band
+        for band_index in band_indexes:
             yield self._np_band_cache[band_index]
 
 
 def _get_segmentize_value(input_file, tile_pyramid):
     """Return the recommended segmentation value in input file units."""
-    with rasterio.open(input_file, "r") as input_raster:
+    with DATASET_POOL.open(input_file) as input_raster:
         pixelsize = input_raster.transform[0]
     return pixelsize * tile_pyramid.tile_size
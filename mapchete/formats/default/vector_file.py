@@ -9,7 +9,8 @@ from shapely.geometry import box, Polygon
 from rasterio.crs import CRS
 
 from mapchete.formats import base
-from mapchete.io.vector import reproject_geometry, read_vector_window
+from mapchete.io.vector import (
+    reproject_geometry, read_vector_window, VectorFileIndex)
 
 
 class InputData(base.InputData):
@@ -46,6 +47,13 @@ class InputData(base.InputData):
         """Initialize."""
         super(InputData, self).__init__(input_params)
         self.path = input_params["path"]
+        self._spatial_index = None
+
+    def __getstate__(self):
+        """Exclude spatial index from pickling."""
+        state = super(InputData, self).__getstate__()
+        state["_spatial_index"] = None
+        return state
 
     def open(self, tile, **kwargs):
         """
@@ -62,24 +70,21 @@ class InputData(base.InputData):
         """
         return InputTile(tile, self, **kwargs)
 
-    def bbox(self, out_crs=None):
+    def spatial_index(self):
         """
-        Return data bounding box.
+        Return spatial index of all input features.
 
-        Parameters
-        ----------
-        out_crs : ``rasterio.crs.CRS``
-            rasterio CRS object (default: CRS of process pyramid)
+        The index is built on first use, i.e. once per worker process.
 
         Returns
         -------
-        bounding box : geometry
-            Shapely geometry object
+        spatial index : ``VectorFileIndex``
         """
-        assert self.path
-        assert self.pyramid
-        if out_crs is None:
-            out_crs = self.pyramid.crs
+        if self._spatial_index is None:
+            self._spatial_index = VectorFileIndex(self.path)
+        return self._spatial_index
+
+    def _bbox(self, out_crs):
         with fiona.open(self.path) as inp:
             inp_crs = CRS(inp.crs)
             try:
@@ -113,12 +118,16 @@ class InputTile(base.InputTile):
     tile : tile : ``Tile``
     vector_file : string
         path to input vector file
+    spatial_index : bool
+        keep all features in memory and query them from a spatial index
+        instead of reading from file for each tile (default: False)
     """
 
-    def __init__(self, tile, vector_file):
+    def __init__(self, tile, vector_file, spatial_index=False):
         """Initialize."""
         self.tile = tile
         self.vector_file = vector_file
+        self.spatial_index = spatial_index
         self._cache = {}
 
     def read(self, validity_check=True):
@@ -145,7 +154,7 @@ class InputTile(base.InputTile):
         -------
         is empty : bool
         """
-        if not self.tile.bbox.intersects(self.vector_file.bbox()):
+        if not self.vector_file.prepared_bbox().intersects(self.tile.bbox):
             return True
         if self.read():
             return False
@@ -157,5 +166,8 @@ class InputTile(base.InputTile):
         if checked not in self._cache:
             self._cache[checked] = list(read_vector_window(
                 self.vector_file.path, self.tile,
-                validity_check=validity_check))
+                validity_check=validity_check,
+                spatial_index=(
+                    self.vector_file.spatial_index()
+                    if self.spatial_index else None)))
         return self._cache[checked]
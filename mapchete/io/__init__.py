@@ -1,5 +1,7 @@
 """Functions for reading and writing data."""
 
+import os
+import errno
 import rasterio
 import ogr
 from shapely.geometry import box
@@ -66,3 +68,138 @@ def get_best_zoom_level(input_file, tile_pyramid_type):
             return zoom-1
 
     raise ValueError("no fitting zoom level found")
+
+
+def makedirs(path):
+    """
+    Create directory and all intermediate directories if necessary.
+
+    Other than ``os.makedirs()``, this does not fail if another worker has
+    created the directory in the meantime.
+
+    Parameters
+    ----------
+    path : string
+        directory path
+    """
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST or not os.path.isdir(path):
+                raise
+
+
+class TileDirectoryIndex(object):
+    """
+    Index of existing tiles in a ``<zoom>/<row>/<col><extension>`` tree.
+
+    Instead of checking every single tile file, all files of a zoom level are
+    listed once when the zoom level is first requested. Tiles missing in this
+    listing are checked on the file system again, as other processes may have
+    written them in the meantime. Only after an explicit ``scan()``, e.g.
+    while looking for tiles to be processed before dispatching them to
+    workers, missing tiles are trusted to be missing without checking the
+    file system. This applies only to the scanning process and only until a
+    tile of this zoom level is discarded, i.e. written by this process.
+
+    Parameters
+    ----------
+    path : string
+        output base directory
+    file_extension : string
+        tile file extension including the dot (e.g. ``.tif``)
+    """
+
+    def __init__(self, path, file_extension):
+        """Initialize."""
+        self.path = path
+        self.file_extension = file_extension
+        self._zooms = {}
+        # process which scanned a zoom level without writing to it since
+        self._scan_pids = {}
+
+    def exists(self, tile_index):
+        """
+        Check whether a tile file exists.
+
+        Parameters
+        ----------
+        tile_index : ``TileIndex`` or tuple
+            zoom, row and col of tile
+
+        Returns
+        -------
+        exists : bool
+        """
+        zoom, row, col = tile_index
+        existing = self._zoom_index(zoom)
+        if (row, col) in existing:
+            return True
+        if self._scan_pids.get(zoom) == os.getpid():
+            return False
+        if os.path.exists(self._tile_path(zoom, row, col)):
+            existing.add((row, col))
+            return True
+        return False
+
+    def discard(self, tile_index):
+        """
+        Remove tile from index, e.g. when it gets (over)written.
+
+        Parameters
+        ----------
+        tile_index : ``TileIndex`` or tuple
+            zoom, row and col of tile
+        """
+        zoom, row, col = tile_index
+        if zoom in self._zooms:
+            self._zooms[zoom].discard((row, col))
+        self._scan_pids.pop(zoom, None)
+
+    def scan(self, zoom):
+        """
+        List existing tiles of a zoom level and trust tiles missing.
+
+        Until a tile of this zoom level is discarded, ``exists()`` does not
+        check the file system for tiles missing in the listing within this
+        process.
+
+        Parameters
+        ----------
+        zoom : integer
+            zoom level
+        """
+        self._zooms[zoom] = self._scan_zoom(zoom)
+        self._scan_pids[zoom] = os.getpid()
+
+    def _zoom_index(self, zoom):
+        try:
+            return self._zooms[zoom]
+        except KeyError:
+            self._zooms[zoom] = self._scan_zoom(zoom)
+            return self._zooms[zoom]
+
+    def _scan_zoom(self, zoom):
+        existing = set()
+        zoom_dir = os.path.join(self.path, str(zoom))
+        try:
+            rows = os.listdir(zoom_dir)
+        except OSError:
+            return existing
+        for row in rows:
+            if not row.isdigit():
+                continue
+            try:
+                files = os.listdir(os.path.join(zoom_dir, row))
+            except OSError:
+                continue
+            for filename in files:
+                col, extension = os.path.splitext(filename)
+                if extension == self.file_extension and col.isdigit():
+                    existing.add((int(row), int(col)))
+        return existing
+
+    def _tile_path(self, zoom, row, col):
+        return os.path.join(
+            self.path, str(zoom), str(row), str(col) + self.file_extension)
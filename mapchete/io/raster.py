@@ -1,12 +1,18 @@
 """Wrapper functions around rasterio and useful raster functions."""
 
 import os
+import threading
+import weakref
 import rasterio
 import numpy as np
 import numpy.ma as ma
+from contextlib import contextmanager
+from functools import partial
+from multiprocessing.pool import ThreadPool
+from multiprocessing.util import Finalize
+from cachetools import LRUCache
 from shapely.geometry import box
 from rasterio.warp import Resampling, transform_bounds, reproject
-from rasterio.windows import from_bounds
 from affine import Affine
 from tilematrix import clip_geometry_to_srs_bounds
 
@@ -23,9 +29,328 @@ RESAMPLING_METHODS = {
     "mode": Resampling.mode
     }
 
+# warp settings used if not set when reading an input; raster_file inputs pass
+# on warp_num_threads and warp_mem_limit of their process
+WARP_DEFAULTS = dict(num_threads=1, warp_mem_limit=0)
+
+
+class RasterDatasetPool(object):
+    """
+    Per worker pool of open rasterio datasets.
+
+    Opening a dataset (parsing headers, discovering overviews, parsing VRT
+    XML) can be more expensive than reading a small tile window. Therefore
+    datasets are kept open and reused until they get evicted from a least
+    recently used cache. As rasterio datasets are neither thread nor fork
+    safe, every thread gets its own datasets and pools inherited from a
+    parent process are discarded. Remaining datasets get closed when the
+    worker process exits.
+
+    Parameters
+    ----------
+    maxsize : integer
+        maximum number of open datasets per thread (default: 16)
+
+    Attributes
+    ----------
+    maxsize : integer
+        maximum number of open datasets per thread
+    """
+
+    def __init__(self, maxsize=16):
+        """Initialize."""
+        self._maxsize = maxsize
+        self._pid = None
+        self._local = None
+        self._caches = None
+        self._lock = threading.Lock()
+
+    @property
+    def maxsize(self):
+        """Maximum number of open datasets per thread."""
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        assert isinstance(maxsize, int)
+        assert maxsize > 0
+        with self._lock:
+            if maxsize == self._maxsize:
+                return
+            self._maxsize = maxsize
+            if self._pid != os.getpid():
+                return
+            # keep caches referenced until their datasets are closed
+            caches = [cache_ref() for cache_ref in self._caches.values()]
+            # every thread creates a new cache with the new size
+            self._local = threading.local()
+            self._caches = {}
+        for datasets in caches:
+            if datasets is not None:
+                datasets.clear()
+
+    @contextmanager
+    def open(self, path):
+        """
+        Provide open dataset.
+
+        Other than ``rasterio.open()``, the dataset is kept open after
+        leaving the context.
+
+        Parameters
+        ----------
+        path : string
+            path to a raster file readable by rasterio
+
+        Yields
+        ------
+        dataset : ``rasterio.io.DatasetReader``
+        """
+        datasets = self._datasets()
+        src = datasets.get(path)
+        if src is None or src.closed:
+            src = rasterio.open(path, "r")
+            datasets[path] = src
+        yield src
+
+    def close(self):
+        """Close all datasets opened by this process."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            for cache_ref in list(self._caches.values()):
+                datasets = cache_ref()
+                if datasets is not None:
+                    datasets.clear()
+
+    def _discard_cache(self, key, cache_ref):
+        self._caches.pop(key, None)
+
+    def _datasets(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Don't close datasets inherited from parent process as the
+                # parent may still use them.
+                self._pid = os.getpid()
+                self._local = threading.local()
+                # caches are mappings and therefore unhashable, so track
+                # them by id
+                self._caches = {}
+                Finalize(None, self.close, exitpriority=10)
+            try:
+                return self._local.datasets
+            except AttributeError:
+                datasets = self._local.datasets = _DatasetCache(
+                    maxsize=self._maxsize)
+                self._caches[id(datasets)] = weakref.ref(
+                    datasets, partial(self._discard_cache, id(datasets)))
+                return datasets
+
+
+class _DatasetCache(LRUCache):
+    """LRU cache closing datasets on removal."""
+
+    def __delitem__(self, key):
+        src = self[key]
+        LRUCache.__delitem__(self, key)
+        src.close()
+
+
+# open datasets of this worker shared by all raster reads
+DATASET_POOL = RasterDatasetPool()
+
+
+class BufferArena(object):
+    """
+    Per worker store of reusable arrays for warped tile data.
+
+    Within a process run, input tiles all have the same shape, so instead of
+    allocating new data and mask arrays for every tile read, released arrays
+    are kept per shape and data type and handed out again. Returned arrays
+    are left uninitialized. Arrays inherited from a parent process are
+    discarded.
+
+    An array handed out by ``empty()`` is owned by the caller until it is
+    passed to ``release()``. Afterwards, it must not be used anymore, as it
+    may be handed out again for another tile, so data which has to stay
+    valid has to be copied before. Arrays sharing memory with data passed as
+    ``keep`` are not reused.
+
+    Parameters
+    ----------
+    maxsize : integer
+        maximum size of all kept arrays in bytes, arrays released beyond this
+        size are dropped (default: 256 MB)
+    """
+
+    def __init__(self, maxsize=256 * 1024 * 1024):
+        """Initialize."""
+        self.maxsize = maxsize
+        self._pid = None
+        self._buffers = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def empty(self, shape, dtype):
+        """
+        Return uninitialized array.
+
+        Parameters
+        ----------
+        shape : tuple
+            array shape
+        dtype : string or ``numpy.dtype``
+            array data type
+
+        Returns
+        -------
+        array : ``numpy.ndarray``
+        """
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            self._reset_if_forked()
+            try:
+                array = self._buffers[key].pop()
+            except (KeyError, IndexError):
+                return np.empty(shape, dtype)
+            self._size -= array.nbytes
+            return array
+
+    def release(self, arrays, keep=None):
+        """
+        Hand back arrays from ``empty()`` to be reused.
+
+        Parameters
+        ----------
+        arrays : list
+            arrays from ``empty()``
+        keep : array or list
+            data still in use, e.g. process output; arrays sharing memory
+            with it are not reused
+        """
+        in_use = _array_parts(keep)
+        with self._lock:
+            self._reset_if_forked()
+            for array in arrays:
+                if self._size + array.nbytes > self.maxsize or any(
+                    np.may_share_memory(array, data) for data in in_use
+                ):
+                    continue
+                self._buffers.setdefault(
+                    (array.shape, array.dtype.str), []).append(array)
+                self._size += array.nbytes
+
+    def _reset_if_forked(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._buffers = {}
+            self._size = 0
+
+
+def _array_parts(data):
+    """Return data and mask arrays within data."""
+    if isinstance(data, ma.MaskedArray):
+        return [data.data, ma.getmask(data)]
+    elif isinstance(data, np.ndarray):
+        return [data]
+    elif isinstance(data, (list, tuple)):
+        return [part for item in data for part in _array_parts(item)]
+    else:
+        return []
+
+
+# reusable data and mask arrays of warped input tiles of this worker
+WARP_BUFFERS = BufferArena()
+
+
+class ReadThreadPool(object):
+    """
+    Per worker thread pool reading parts of a tile concurrently.
+
+    GDAL releases the GIL while reading and warping, so bands, antimeridian
+    parts and inputs of a single tile can be read in parallel. The pool is
+    only started if more than one thread is configured and is restarted in
+    forked processes. Reads started from within a pool thread are run
+    sequentially, so nested reads cannot block each other.
+
+    Parameters
+    ----------
+    size : integer
+        number of threads (default: 1, i.e. read sequentially)
+
+    Attributes
+    ----------
+    size : integer
+        number of threads
+    """
+
+    def __init__(self, size=1):
+        """Initialize."""
+        self._size = size
+        self._pid = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def size(self):
+        """Number of threads."""
+        return self._size
+
+    @size.setter
+    def size(self, size):
+        assert isinstance(size, int)
+        assert size > 0
+        with self._lock:
+            if size != self._size:
+                if self._pool is not None and self._pid == os.getpid():
+                    self._pool.close()
+                self._pool = None
+                self._size = size
+
+    @property
+    def active(self):
+        """Whether calls to map() from this thread run concurrently."""
+        return self._size > 1 and not getattr(self._local, "worker", False)
+
+    def map(self, func, iterable):
+        """
+        Apply function to all items and return results in order.
+
+        Parameters
+        ----------
+        func : function
+        iterable : iterable
+
+        Returns
+        -------
+        results : list
+        """
+        items = list(iterable)
+        if len(items) < 2 or not self.active:
+            return [func(item) for item in items]
+        return self._thread_pool().map(partial(self._run, func), items)
+
+    def _run(self, func, item):
+        self._local.worker = True
+        return func(item)
+
+    def _thread_pool(self):
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # threads of a pool inherited from a parent process are gone
+                self._pid = os.getpid()
+                self._pool = ThreadPool(self._size)
+            return self._pool
+
+
+# reads bands, parts and inputs of a tile concurrently if configured
+READ_POOL = ReadThreadPool()
+
 
 def read_raster_window(
-    input_file, tile, indexes=None, resampling="nearest"
+    input_file, tile, indexes=None, resampling="nearest", num_threads=None,
+    warp_mem_limit=None, buffers=None
 ):
     """
     Generate NumPy arrays from an input raster.
@@ -45,10 +370,22 @@ def read_raster_window(
         a list of band numbers; None will read all.
     resampling : string
         one of "nearest", "average", "bilinear" or "lanczos"
-
-    Returns
-    -------
-    raster : MaskedArray
+    num_threads : integer
+        number of threads GDAL uses when warping (default: use
+        ``WARP_DEFAULTS``)
+    warp_mem_limit : integer
+        GDAL warp memory limit in MB, 0 uses the GDAL default (default: use
+        ``WARP_DEFAULTS``)
+    buffers : list
+        if given, warped data is written into arrays from ``WARP_BUFFERS``
+        which are appended to this list; the caller has to hand them back
+        using ``WARP_BUFFERS.release()`` once the data is not used anymore
+        (default: None, i.e. return newly allocated arrays)
+
+    Yields
+    ------
+    band : MaskedArray
+        all bands are read at once but returned one by one
     """
     try:
         assert os.path.isfile(input_file)
@@ -63,27 +400,33 @@ def read_raster_window(
     # Check if potentially tile boundaries exceed tile matrix boundaries on
     # the antimeridian, the northern or the southern boundary.
     if tile.pixelbuffer and _is_on_edge(tile):
-        for band_idx in band_indexes:
-            yield _get_warped_edge_array(
-                tile=tile, input_file=input_file, band_idx=band_idx,
-                dst_bounds=tile.bounds, dst_shape=tile.shape,
-                dst_affine=tile.affine, dst_crs=tile.crs, resampling=resampling
-            )
+        bands = _get_warped_edge_array(
+            tile=tile, input_file=input_file, indexes=band_indexes,
+            dst_bounds=tile.bounds, dst_shape=tile.shape,
+            dst_affine=tile.affine, dst_crs=tile.crs, resampling=resampling,
+            num_threads=num_threads, warp_mem_limit=warp_mem_limit,
+            buffers=buffers
+        )
 
     # If tile boundaries don't exceed pyramid boundaries, simply read window
     # once.
     else:
-        for band_idx in band_indexes:
-            yield _get_warped_array(
-                input_file=input_file, band_idx=band_idx,
-                dst_bounds=tile.bounds, dst_shape=tile.shape,
-                dst_affine=tile.affine, dst_crs=tile.crs, resampling=resampling
-            )
+        bands = _get_warped_array(
+            input_file=input_file, indexes=band_indexes,
+            dst_bounds=tile.bounds, dst_shape=tile.shape,
+            dst_affine=tile.affine, dst_crs=tile.crs, resampling=resampling,
+            num_threads=num_threads, warp_mem_limit=warp_mem_limit,
+            buffers=buffers
+        )
+    # All bands are read and warped at once, yield them one by one.
+    for band in bands:
+        yield band
 
 
 def _get_warped_edge_array(
-    tile=None, input_file=None, band_idx=None, dst_bounds=None, dst_shape=None,
-    dst_affine=None, dst_crs=None, resampling="nearest"
+    tile=None, input_file=None, indexes=None, dst_bounds=None, dst_shape=None,
+    dst_affine=None, dst_crs=None, resampling="nearest", num_threads=None,
+    warp_mem_limit=None, buffers=None
 ):
     tile_boxes = clip_geometry_to_srs_bounds(
         tile.bbox, tile.tile_pyramid, multipart=True)
@@ -115,75 +458,272 @@ def _get_warped_edge_array(
             parts_metadata.update(right=part_metadata)
         else:
             parts_metadata.update(none=part_metadata)
-    # Finally, stitch numpy arrays together into one.
-    return ma.concatenate(
-        [
-            _get_warped_array(
-                input_file=input_file, band_idx=band_idx,
-                dst_bounds=parts_metadata[part]["bounds"],
-                dst_shape=parts_metadata[part]["shape"],
-                dst_affine=parts_metadata[part]["affine"],
-                dst_crs=tile.crs, resampling=resampling)
-            for part in ["none", "left", "middle", "right"]
-            if parts_metadata[part]
-        ], axis=1)
+    parts = [
+        parts_metadata[part] for part in ["none", "left", "middle", "right"]
+        if parts_metadata[part]
+    ]
+    # Warp parts side by side into one array.
+    out_shape = (
+        len(indexes), parts[0]["shape"][0],
+        sum(part["shape"][1] for part in parts))
+    windows = []
+    col_off = 0
+    for part in parts:
+        width = part["shape"][1]
+        windows.append((slice(col_off, col_off + width), dict(
+            dst_bounds=part["bounds"], dst_shape=part["shape"],
+            dst_affine=part["affine"])))
+        col_off += width
+    return _warp_windows(
+        input_file, indexes, out_shape, windows, dst_crs=tile.crs,
+        resampling=resampling, num_threads=num_threads,
+        warp_mem_limit=warp_mem_limit, buffers=buffers)
 
 
 def _get_warped_array(
-    input_file=None, band_idx=None, dst_bounds=None, dst_shape=None,
-    dst_affine=None, dst_crs=None, resampling="nearest"
+    input_file=None, indexes=None, dst_bounds=None, dst_shape=None,
+    dst_affine=None, dst_crs=None, resampling="nearest", num_threads=None,
+    warp_mem_limit=None, buffers=None
 ):
-    """Extract a numpy array from a raster file."""
+    """
+    Extract a 3D numpy array of all requested bands from a raster file.
+
+    All bands are read within one window read and reprojected within one
+    reproject call.
+    """
     assert isinstance(input_file, str)
-    assert isinstance(band_idx, int)
+    if READ_POOL.active and len(indexes) > 1:
+        # read bands concurrently
+        return _warp_windows(
+            input_file, indexes, (len(indexes), ) + dst_shape,
+            [(slice(None), dict(
+                dst_bounds=dst_bounds, dst_shape=dst_shape,
+                dst_affine=dst_affine))],
+            dst_crs=dst_crs, resampling=resampling, num_threads=num_threads,
+            warp_mem_limit=warp_mem_limit, buffers=buffers)
+    with DATASET_POOL.open(input_file) as src:
+        return _warp_window(
+            src, indexes=indexes, dst_bounds=dst_bounds, dst_shape=dst_shape,
+            dst_affine=dst_affine, dst_crs=dst_crs, resampling=resampling,
+            num_threads=num_threads, warp_mem_limit=warp_mem_limit,
+            buffers=buffers)
+
+
+def _warp_windows(
+    input_file, indexes, out_shape, windows, buffers=None, **kwargs
+):
+    """
+    Warp windows into column slices of one array.
+
+    windows is a list of (column slice, _warp_window() arguments) tuples. If
+    the read pool is active, every band of every window is warped in its
+    own thread using the thread's own dataset.
+    """
+    with DATASET_POOL.open(input_file) as src:
+        out = _new_array(out_shape, src.profile["dtype"], buffers)
+    out.mask.fill(True)
+    if READ_POOL.active:
+        band_groups = [
+            (slice(band, band + 1), [index])
+            for band, index in enumerate(indexes)]
+    else:
+        band_groups = [(slice(None), indexes)]
+
+    def _warp(job):
+        (bands, band_indexes), (cols, window_kwargs) = job
+        window_kwargs.update(kwargs)
+        with DATASET_POOL.open(input_file) as src:
+            _warp_window(
+                src, indexes=band_indexes, out=out[bands, :, cols],
+                **window_kwargs)
+
+    READ_POOL.map(_warp, [
+        (band_group, (cols, dict(window_kwargs)))
+        for band_group in band_groups
+        for cols, window_kwargs in windows])
+    return out
+
+
+def _warp_window(
+    src, indexes=None, dst_bounds=None, dst_shape=None, dst_affine=None,
+    dst_crs=None, resampling="nearest", num_threads=None, warp_mem_limit=None,
+    out=None, buffers=None
+):
+    """
+    Read and reproject all requested bands of an open dataset.
+
+    If out is given, data is written into this masked array (e.g. a slice of
+    a larger array) which is then returned, otherwise a new array is created
+    or taken from WARP_BUFFERS if buffers is given.
+    """
+    assert isinstance(indexes, list)
     assert isinstance(dst_bounds, tuple)
     assert isinstance(dst_shape, tuple)
     assert isinstance(dst_affine, Affine)
     assert dst_crs.is_valid
-    with rasterio.open(input_file, "r") as src:
-        if dst_crs == src.crs:
-            src_left, src_bottom, src_right, src_top = dst_bounds
-        else:
-            # Return empty array if destination bounds don't intersect with
-            # file bounds.
-            file_bbox = box(*src.bounds)
-            tile_bbox = reproject_geometry(
-                box(*dst_bounds), src_crs=dst_crs, dst_crs=src.crs)
-            if not file_bbox.intersects(tile_bbox):
-                return ma.MaskedArray(
-                    data=ma.zeros(dst_shape, dtype=src.profile["dtype"]),
-                    mask=ma.ones(dst_shape), fill_value=src.nodata)
-            # Reproject tile bounds to source file SRS.
-            src_left, src_bottom, src_right, src_top = transform_bounds(
-                dst_crs, src.crs, *dst_bounds, densify_pts=21)
-        if float('Inf') in (src_left, src_bottom, src_right, src_top):
-            # Maybe not the best way to deal with it, but if bounding box
-            # cannot be translated, it is assumed that data is emtpy
-            return ma.MaskedArray(
-                data=ma.zeros(dst_shape, dtype=src.profile["dtype"]),
-                mask=ma.ones(dst_shape), fill_value=src.nodata)
-        # Read data window.
-        window = src.window(
-            src_left, src_bottom, src_right, src_top, boundless=True)
-        src_band = src.read(
-            band_idx, window=window, masked=True, boundless=True)
-        # Prepare reprojected array.
-        nodataval = src.nodata
-        # Quick fix because None nodata is not allowed.
-        if not nodataval:
-            nodataval = 0
-        dst_band = np.zeros(
-                dst_shape,
-                src.dtypes[band_idx-1]
-            )
-        dst_band[:] = nodataval
-        # Run rasterio's reproject().
-        reproject(
-            src_band, dst_band, src_transform=src.window_transform(window),
-            src_crs=src.crs, src_nodata=nodataval, dst_transform=dst_affine,
-            dst_crs=dst_crs, dst_nodata=nodataval,
-            resampling=RESAMPLING_METHODS[resampling])
-        return ma.MaskedArray(dst_band, mask=dst_band == nodataval)
+    dst_shape = (len(indexes), ) + dst_shape
+    if dst_crs == src.crs:
+        offsets = _aligned_offsets(src.transform, dst_affine)
+        if offsets:
+            # Source pixels match destination pixels, no need to warp.
+            row_off, col_off = offsets
+            return _to_out(_read_aligned(
+                src, indexes, ((row_off, row_off + dst_shape[1]), (
+                    col_off, col_off + dst_shape[2]))), out)
+        src_left, src_bottom, src_right, src_top = dst_bounds
+    else:
+        # Return empty array if destination bounds don't intersect with
+        # file bounds.
+        file_bbox = box(*src.bounds)
+        tile_bbox = reproject_geometry(
+            box(*dst_bounds), src_crs=dst_crs, dst_crs=src.crs)
+        if not file_bbox.intersects(tile_bbox):
+            return _empty_array(src, dst_shape, out, buffers)
+        # Reproject tile bounds to source file SRS.
+        src_left, src_bottom, src_right, src_top = transform_bounds(
+            dst_crs, src.crs, *dst_bounds, densify_pts=21)
+    if float('Inf') in (src_left, src_bottom, src_right, src_top):
+        # Maybe not the best way to deal with it, but if bounding box
+        # cannot be translated, it is assumed that data is emtpy
+        return _empty_array(src, dst_shape, out, buffers)
+    # Read data window, use overviews if they match the target resolution.
+    window = src.window(
+        src_left, src_bottom, src_right, src_top, boundless=True)
+    src_transform = src.window_transform(window)
+    factor = _best_overview_factor(
+        src, indexes, (window.num_rows, window.num_cols), dst_shape[1:])
+    if factor > 1:
+        out_height = max(int(round(window.num_rows / float(factor))), 1)
+        out_width = max(int(round(window.num_cols / float(factor))), 1)
+        src_bands = src.read(
+            indexes, window=window, masked=True, boundless=True,
+            out_shape=(len(indexes), out_height, out_width))
+        src_transform *= Affine.scale(
+            window.num_cols / float(out_width),
+            window.num_rows / float(out_height))
+    else:
+        src_bands = src.read(
+            indexes, window=window, masked=True, boundless=True)
+    nodataval = src.nodata
+    # Quick fix because None nodata is not allowed.
+    if not nodataval:
+        nodataval = 0
+    # Prepare reprojected array.
+    if out is None:
+        out = _new_array(dst_shape, src_bands.dtype, buffers)
+    dst_bands = out.data
+    dst_bands.fill(nodataval)
+    # Run rasterio's reproject().
+    reproject(
+        src_bands, dst_bands, src_transform=src_transform,
+        src_crs=src.crs, src_nodata=nodataval, dst_transform=dst_affine,
+        dst_crs=dst_crs, dst_nodata=nodataval,
+        resampling=RESAMPLING_METHODS[resampling],
+        **_warp_kwargs(num_threads, warp_mem_limit))
+    np.equal(dst_bands, nodataval, out=out.mask)
+    return out
+
+
+def _new_array(shape, dtype, buffers=None):
+    """Return uninitialized masked array, use WARP_BUFFERS if buffers given."""
+    if buffers is None:
+        return ma.MaskedArray(
+            np.empty(shape, dtype=dtype), mask=np.empty(shape, dtype=bool))
+    data = WARP_BUFFERS.empty(shape, dtype)
+    mask = WARP_BUFFERS.empty(shape, bool)
+    buffers.extend([data, mask])
+    return ma.MaskedArray(data, mask=mask)
+
+
+def _empty_array(src, dst_shape, out=None, buffers=None):
+    """Return fully masked array."""
+    if out is None:
+        out = _new_array(dst_shape, src.profile["dtype"], buffers)
+        out.fill_value = src.nodata
+    out.data.fill(0)
+    out.mask.fill(True)
+    return out
+
+
+def _to_out(data, out=None):
+    """Copy masked array into out if given."""
+    if out is None:
+        return data
+    out.data[:] = data.data
+    out.mask[:] = ma.getmaskarray(data)
+    return out
+
+
+def _warp_kwargs(num_threads=None, warp_mem_limit=None):
+    """Return reproject() keyword arguments with fallback on WARP_DEFAULTS."""
+    if num_threads is None:
+        num_threads = WARP_DEFAULTS["num_threads"]
+    if warp_mem_limit is None:
+        warp_mem_limit = WARP_DEFAULTS["warp_mem_limit"]
+    kwargs = dict(num_threads=num_threads)
+    # only passed on if set as older rasterio versions do not support it
+    if warp_mem_limit:
+        kwargs.update(warp_mem_limit=warp_mem_limit)
+    return kwargs
+
+
+def _aligned_offsets(src_affine, dst_affine, tolerance=1e-6):
+    """
+    Return pixel offsets of destination grid if both grids are aligned.
+
+    Grids are aligned if they have the same resolution and their origins are
+    whole pixels apart. Returns (row, col) offsets of the destination origin
+    in source pixels or None if grids are not aligned.
+    """
+    if src_affine.b or src_affine.d or dst_affine.b or dst_affine.d:
+        return None
+    if (
+        abs(src_affine.a - dst_affine.a) > tolerance * abs(src_affine.a) or
+        abs(src_affine.e - dst_affine.e) > tolerance * abs(src_affine.e)
+    ):
+        return None
+    col_off = (dst_affine.c - src_affine.c) / src_affine.a
+    row_off = (dst_affine.f - src_affine.f) / src_affine.e
+    if (
+        abs(col_off - round(col_off)) > tolerance or
+        abs(row_off - round(row_off)) > tolerance
+    ):
+        return None
+    return int(round(row_off)), int(round(col_off))
+
+
+def _read_aligned(src, indexes, window):
+    """Read window from dataset aligned with the destination grid."""
+    src_bands = src.read(indexes, window=window, masked=True, boundless=True)
+    nodataval = src.nodata
+    # Quick fix because None nodata is not allowed.
+    if not nodataval:
+        nodataval = 0
+    # mask nodata values the same way as reprojected data
+    return ma.MaskedArray(
+        src_bands.data,
+        mask=ma.getmaskarray(src_bands) | (src_bands.data == nodataval))
+
+
+def _best_overview_factor(src, indexes, src_shape, dst_shape):
+    """
+    Return decimation factor of the smallest overview to be read.
+
+    The overview resolution must not be coarser than the target resolution.
+    If there is no such overview for all bands, 1 is returned, i.e. the full
+    resolution band should be read.
+    """
+    decimation = min(
+        float(src_shape[0]) / dst_shape[0],
+        float(src_shape[1]) / dst_shape[1])
+    # overview factors start at 2
+    if decimation < 2:
+        return 1
+    overviews = set(src.overviews(indexes[0]))
+    for index in indexes[1:]:
+        overviews.intersection_update(src.overviews(index))
+    fitting = [factor for factor in overviews if factor <= decimation]
+    return max(fitting) if fitting else 1
 
 
 def _is_on_edge(tile):
@@ -204,8 +744,8 @@ def _get_band_indexes(indexes, input_file):
         else:
             return [indexes]
     else:
-        with rasterio.open(input_file, "r") as src:
-            return src.indexes
+        with DATASET_POOL.open(input_file) as src:
+            return list(src.indexes)
 
 
 def write_raster_window(
@@ -258,11 +798,9 @@ def extract_from_tile(in_tile, out_tile):
     if isinstance(in_tile, BufferedTile):
         if isinstance(in_tile.data, (np.ndarray, ma.MaskedArray)):
             pass
-        elif isinstance(in_tile.data, tuple):
-            in_tile.data = ma.MaskedArray(
-                data=np.stack(in_tile.data),
-                mask=np.stack(in_tile.data.mask)
-            )
+        elif isinstance(in_tile.data, (tuple, list)):
+            # convert once so following extracts can use the array directly
+            in_tile.data = prepare_array(in_tile.data)
         else:
             raise TypeError("wrong input data type: %s" % type(in_tile.data))
     else:
@@ -276,6 +814,9 @@ def extract_from_array(in_data, in_affine, out_tile):
     """
     Extract raster data window array.
 
+    The window is determined using integer pixel offsets, so the extracted
+    array is a view on the input array and no data is copied.
+
     Parameters
     ----------
     in_data : array
@@ -288,29 +829,45 @@ def extract_from_array(in_data, in_affine, out_tile):
     """
     if isinstance(in_data, (np.ndarray, ma.MaskedArray)):
         pass
-    elif isinstance(in_data, tuple):
-        in_data = ma.MaskedArray(
-            data=np.stack(in_data),
-            mask=np.stack([band.mask for band in in_data]))
+    elif isinstance(in_data, (tuple, list)):
+        in_data = prepare_array(in_data)
     else:
         raise TypeError("wrong input data type: %s" % type(in_data))
     left, bottom, right, top = out_tile.bounds
-    if in_data.ndim == 2:
-        window = from_bounds(
-            left, bottom, right, top, in_affine, height=in_data.shape[0],
-            width=in_data.shape[1])
-    else:
-        window = from_bounds(
-            left, bottom, right, top, in_affine, height=in_data[0].shape[0],
-            width=in_data[0].shape[1])
-    minrow = window.row_off
-    maxrow = window.row_off + window.num_rows
-    mincol = window.col_off
-    maxcol = window.col_off + window.num_cols
-    if in_data.ndim == 2:
-        return in_data[minrow:maxrow, mincol:maxcol]
+    minrow = int(round((in_affine.f - top) / -in_affine.e))
+    mincol = int(round((left - in_affine.c) / in_affine.a))
+    maxrow = minrow + out_tile.height
+    maxcol = mincol + out_tile.width
+    return in_data[..., minrow:maxrow, mincol:maxcol]
+
+
+def prepare_array(data):
+    """
+    Convert raster data into one contiguous masked array.
+
+    Bands given as tuple or list are stacked into a 3D array, a single 2D
+    array keeps its dimensions. The mask is always a full boolean array, so
+    windows extracted from the array are views on both data and mask.
+
+    Parameters
+    ----------
+    data : array, tuple or list
+        raster data as array or bands
+
+    Returns
+    -------
+    raster data : ``numpy.ma.MaskedArray``
+    """
+    if isinstance(data, (tuple, list)):
+        return ma.MaskedArray(
+            data=np.stack([ma.getdata(band) for band in data]),
+            mask=np.stack([ma.getmaskarray(band) for band in data]))
+    elif isinstance(data, (np.ndarray, ma.MaskedArray)):
+        return ma.MaskedArray(
+            data=np.ascontiguousarray(ma.getdata(data)),
+            mask=np.ascontiguousarray(ma.getmaskarray(data)))
     else:
-        return in_data[..., minrow:maxrow, mincol:maxcol]
+        raise TypeError("wrong input data type: %s" % type(data))
 
 
 def resample_from_array(
@@ -353,57 +910,63 @@ def resample_from_array(
     reproject(
         in_data, dst_data, src_transform=in_affine, src_crs=out_tile.crs,
         dst_transform=out_tile.affine, dst_crs=out_tile.crs,
-        resampling=RESAMPLING_METHODS[resampling])
+        resampling=RESAMPLING_METHODS[resampling], **_warp_kwargs())
     return dst_data
 
 
-def create_mosaic(tiles, nodata=0):
+def create_mosaic(tiles, nodata=0, out=None):
     """
     Create a mosaic from tiles.
 
+    Tile data is written into preallocated data and mask arrays at integer
+    pixel offsets. Pixels are masked if they are masked in the tile data or
+    equal the nodata value.
+
     Parameters
     ----------
     tiles : iterable
         an iterable containing BufferedTiles
     nodata : integer or float
         raster nodata value (default: 0)
+    out : ``numpy.ma.MaskedArray``
+        optional array of mosaic shape to write into instead of allocating a
+        new one
 
     Returns
     -------
     mosaic, affine : tuple
     """
-    tiles_list = list(tiles)
-    tiles = tiles_list
+    tiles = list(tiles)
     if not tiles:
         raise RuntimeError("no tiles provided for mosaic")
-    elif len(tiles) == 1:
+    elif len(tiles) == 1 and out is None:
         return tiles[0].data, tiles[0].affine
     resolution = None
     dtype = None
     num_bands = 0
     m_left, m_bottom, m_right, m_top = None, None, None, None
+    tiles_data = []
     for tile in tiles:
         if isinstance(tile.data, (np.ndarray, ma.MaskedArray)):
             if tile.data.ndim == 2:
-                tile_data = ma.expand_dims(tile.data, axis=0)
+                tile_data = tile.data[np.newaxis]
             elif tile.data.ndim == 3:
                 tile_data = tile.data
             else:
                 raise TypeError("tile.data bands must be 2-dimensional")
         elif isinstance(tile.data, tuple):
-            tile_data = np.stack(tile.data)
+            tile_data = prepare_array(tile.data)
         else:
             raise TypeError("tile.data must be an array or a tuple of arrays")
-        if isinstance(tile.data, (np.ndarray)):
-            tile.data = ma.masked_where(tile.data == nodata, tile.data)
+        tiles_data.append(tile_data)
         num_bands = tile_data.shape[0]
         if resolution is None:
             resolution = tile.pixel_x_size
         if tile.pixel_x_size != resolution:
             raise RuntimeError("tiles must have same resolution")
         if dtype is None:
-            dtype = tile_data[0].dtype
-        if tile_data[0].dtype != dtype:
+            dtype = tile_data.dtype
+        if tile_data.dtype != dtype:
             raise RuntimeError("all tiles must have the same dtype")
         left, bottom, right, top = tile.bounds
         m_left = min([left, m_left]) if m_left is not None else left
@@ -412,22 +975,36 @@ def create_mosaic(tiles, nodata=0):
         m_top = max([top, m_top]) if m_top is not None else top
     height = int(round((m_top - m_bottom) / resolution))
     width = int(round((m_right - m_left) / resolution))
-    mosaic = ma.MaskedArray(
-            data=np.full(
-                (num_bands, height, width), dtype=dtype, fill_value=nodata),
-            mask=np.ones((num_bands, height, width))
-        )
+    shape = (num_bands, height, width)
+    if out is None:
+        mosaic = ma.MaskedArray(
+            data=np.full(shape, dtype=dtype, fill_value=nodata),
+            mask=np.ones(shape, dtype=bool))
+    else:
+        if not isinstance(out, ma.MaskedArray) or out.shape != shape:
+            raise ValueError(
+                "out must be a masked array of shape %s" % str(shape))
+        mosaic = out
+        mosaic.data[:] = nodata
+        if mosaic.mask is ma.nomask:
+            mosaic.mask = np.ones(shape, dtype=bool)
+        else:
+            mosaic.mask[:] = True
+    mosaic_data = mosaic.data
+    mosaic_mask = mosaic.mask
     mosaic_affine = Affine.translation(m_left, m_top) * Affine.scale(
         resolution, -resolution)
-    for tile in tiles:
+    for tile, tile_data in zip(tiles, tiles_data):
         t_left, t_bottom, t_right, t_top = tile.bounds
-        window = from_bounds(
-            t_left, t_bottom, t_right, t_top, mosaic_affine, height=height,
-            width=width)
-        minrow = window.row_off
-        maxrow = window.row_off + window.num_rows
-        mincol = window.col_off
-        maxcol = window.col_off + window.num_cols
-        mosaic[:, minrow:maxrow, mincol:maxcol] = tile.data
-        mosaic.mask[:, minrow:maxrow, mincol:maxcol] = tile.data.mask
+        minrow = int(round((m_top - t_top) / resolution))
+        mincol = int(round((t_left - m_left) / resolution))
+        window = (
+            slice(None),
+            slice(minrow, minrow + tile_data.shape[1]),
+            slice(mincol, mincol + tile_data.shape[2]))
+        data_window = mosaic_data[window]
+        mask_window = mosaic_mask[window]
+        data_window[:] = ma.getdata(tile_data)
+        np.equal(data_window, nodata, out=mask_window)
+        mask_window |= ma.getmask(tile_data)
     return (mosaic, mosaic_affine)
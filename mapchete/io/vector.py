@@ -4,12 +4,16 @@ import warnings
 import pyproj
 import os
 import fiona
+import numpy as np
 from functools import partial
 from rasterio.crs import CRS
 from shapely.geometry import (
-    box, shape, mapping, MultiPoint, MultiLineString, MultiPolygon)
+    box, shape, mapping, MultiPoint, MultiLineString, MultiPolygon, Point,
+    Polygon)
+from shapely.geometry.base import BaseGeometry
 from shapely.geos import TopologicalError
 from shapely.ops import transform
+from shapely.strtree import STRtree
 from tilematrix import clip_geometry_to_srs_bounds
 from itertools import chain
 
@@ -24,6 +28,12 @@ CRS_BOUNDS = {
     # unknown source
     3035: (-10.6700, 34.5000, 31.5500, 71.0500)
     }
+WGS84_CRS = CRS().from_epsg(4326)
+
+# CRS validity, CRS bounds and pyproj projections are determined once per CRS
+_CRS_VALID_CACHE = {}
+_CRS_BOUNDS_CACHE = {}
+_PROJ_CACHE = {}
 
 
 def reproject_geometry(
@@ -54,73 +64,195 @@ def reproject_geometry(
     -------
     geometry : ``shapely.geometry``
     """
-    assert geometry.is_valid
-    assert src_crs.is_valid
-    assert dst_crs.is_valid
+    return reproject_geometries(
+        [geometry], src_crs, dst_crs, error_on_clip=error_on_clip,
+        validity_check=validity_check)[0]
+
+
+def reproject_geometries(
+    geometries, src_crs, dst_crs, error_on_clip=False, validity_check=True
+):
+    """
+    Reproject a list of geometries at once.
+
+    Coordinates of all geometries are packed into one array and transformed
+    in one go. Geometries are clipped to the destination CRS boundary like in
+    ``reproject_geometry()``.
+
+    Parameters
+    ----------
+    geometries : list
+        list of ``shapely.geometry`` objects
+    src_crs : ``rasterio.crs.CRS``
+        CRS of source data
+    dst_crs : ``rasterio.crs.CRS``
+        target CRS
+    error_on_clip : bool
+        raises a ``RuntimeError`` if a geometry is outside of CRS bounds
+        (default: False)
+    validity_check : bool
+        checks if reprojected geometries are valid and throws
+        ``RuntimeError`` if invalid (default: True)
+
+    Returns
+    -------
+    geometries : list
+        list of ``shapely.geometry`` objects
+    """
+    assert all(geometry.is_valid for geometry in geometries)
+    assert _crs_is_valid(src_crs)
+    assert _crs_is_valid(dst_crs)
 
     if src_crs == dst_crs:
-        return geometry
+        return list(geometries)
 
-    # check if geometry has to be clipped
-    if dst_crs.is_epsg_code:
-        dst_epsg = int(dst_crs.to_dict()['init'].split(':')[1])
-    if dst_crs.is_epsg_code and dst_epsg in CRS_BOUNDS:
-        wgs84_crs = CRS().from_epsg(4326)
-        # get dst_crs boundaries
-        crs_bbox = box(*CRS_BOUNDS[dst_epsg])
-        geometry_4326 = _reproject_geom(
-            geometry,
+    # check if geometries have to be clipped
+    crs_bbox = _crs_bbox(dst_crs)
+    if crs_bbox is not None:
+        geometries_4326 = _reproject_geoms(
+            geometries,
             src_crs,
-            wgs84_crs,
+            WGS84_CRS,
             validity_check=validity_check
             )
         # raise optional error if geometry has to be clipped
-        if error_on_clip and not geometry_4326.within(crs_bbox):
+        if error_on_clip and not all(
+            geometry.within(crs_bbox) for geometry in geometries_4326
+        ):
             raise RuntimeError("geometry outside targed CRS bounds")
-        try:
-            bbox_intersection = crs_bbox.intersection(geometry_4326)
-        except TopologicalError:
-            try:
-                bbox_intersection = crs_bbox.intersection(
-                    geometry_4326.buffer(0)
-                    )
-                warnings.warn("geometry fixed after clipping")
-            except:
-                raise
-        # clip geometry dst_crs boundaries
-        return _reproject_geom(
-            bbox_intersection,
-            wgs84_crs,
+        # clip geometries to dst_crs boundaries
+        return _reproject_geoms(
+            [
+                _clip_to_crs_bbox(geometry, crs_bbox)
+                for geometry in geometries_4326
+            ],
+            WGS84_CRS,
             dst_crs,
             validity_check=validity_check
             )
     else:
         # try without clipping
-        return _reproject_geom(
-            geometry,
+        return _reproject_geoms(
+            geometries,
             src_crs,
             dst_crs
             )
 
 
-def _reproject_geom(
-    geometry, src_crs, dst_crs, validity_check=True
+def _clip_to_crs_bbox(geometry, crs_bbox):
+    try:
+        return crs_bbox.intersection(geometry)
+    except TopologicalError:
+        bbox_intersection = crs_bbox.intersection(geometry.buffer(0))
+        warnings.warn("geometry fixed after clipping")
+        return bbox_intersection
+
+
+def _crs_is_valid(crs):
+    crs_key = crs.to_string()
+    if crs_key not in _CRS_VALID_CACHE:
+        _CRS_VALID_CACHE[crs_key] = crs.is_valid
+    return _CRS_VALID_CACHE[crs_key]
+
+
+def _crs_bbox(crs):
+    """Return CRS bounds in WGS84 as box geometry or None if unknown."""
+    crs_key = crs.to_string()
+    if crs_key not in _CRS_BOUNDS_CACHE:
+        crs_bbox = None
+        if crs.is_epsg_code:
+            epsg = int(crs.to_dict()['init'].split(':')[1])
+            if epsg in CRS_BOUNDS:
+                crs_bbox = box(*CRS_BOUNDS[epsg])
+        _CRS_BOUNDS_CACHE[crs_key] = crs_bbox
+    return _CRS_BOUNDS_CACHE[crs_key]
+
+
+def _get_proj(crs):
+    crs_key = crs.to_string()
+    if crs_key not in _PROJ_CACHE:
+        _PROJ_CACHE[crs_key] = pyproj.Proj(crs)
+    return _PROJ_CACHE[crs_key]
+
+
+def _reproject_geoms(
+    geometries, src_crs, dst_crs, validity_check=True
 ):
-    project = partial(
-        pyproj.transform,
-        pyproj.Proj(src_crs),
-        pyproj.Proj(dst_crs)
-    )
-    out_geom = transform(project, geometry)
+    out_geoms = _transform_geoms(
+        geometries, _get_proj(src_crs), _get_proj(dst_crs))
     if validity_check:
         try:
-            assert out_geom.is_valid
+            assert all(out_geom.is_valid for out_geom in out_geoms)
         except:
             raise RuntimeError("invalid geometry after reprojection")
-    return out_geom
+    return out_geoms
+
 
+def _transform_geoms(geometries, src_proj, dst_proj):
+    """Transform coordinates of all geometries in one pyproj call."""
+    coords = [
+        list(_geom_coords(geometry)) if not geometry.is_empty else []
+        for geometry in geometries
+    ]
+    parts = [part for geometry_coords in coords for part in geometry_coords]
+    if not parts:
+        return list(geometries)
+    try:
+        xyz = np.concatenate(parts)
+    except ValueError:
+        # mixed 2D and 3D coordinates
+        return [
+            transform(partial(pyproj.transform, src_proj, dst_proj), geometry)
+            for geometry in geometries
+        ]
+    transformed = np.column_stack(
+        pyproj.transform(src_proj, dst_proj, *xyz.T))
+    offsets = np.cumsum([len(part) for part in parts])
+    transformed_parts = iter(np.split(transformed, offsets[:-1]))
+    return [
+        _build_geom(geometry, transformed_parts) if geometry_coords
+        else geometry
+        for geometry, geometry_coords in zip(geometries, coords)
+    ]
+
+
+def _geom_coords(geometry):
+    """Yield coordinate arrays of all geometry parts in order."""
+    if geometry.geom_type == "Polygon":
+        yield np.asarray(geometry.exterior.coords)
+        for interior in geometry.interiors:
+            yield np.asarray(interior.coords)
+    elif hasattr(geometry, "geoms"):
+        for part in geometry.geoms:
+            for coords in _geom_coords(part):
+                yield coords
+    else:
+        yield np.asarray(geometry.coords)
+
+
+def _build_geom(geometry, coords):
+    """Rebuild geometry from coordinate arrays in _geom_coords() order."""
+    if geometry.geom_type == "Polygon":
+        exterior = coords.next()
+        return Polygon(
+            exterior, [coords.next() for _ in geometry.interiors])
+    elif geometry.geom_type == "MultiPolygon":
+        # shell and holes tuples spare creating intermediate polygons
+        return MultiPolygon([
+            (coords.next(), [coords.next() for _ in part.interiors])
+            for part in geometry.geoms])
+    elif hasattr(geometry, "geoms"):
+        return type(geometry)([
+            _build_geom(part, coords) for part in geometry.geoms])
+    elif geometry.geom_type == "Point":
+        return Point(coords.next()[0])
+    else:
+        return type(geometry)(coords.next())
 
-def read_vector_window(input_file, tile, validity_check=True):
+
+def read_vector_window(
+    input_file, tile, validity_check=True, spatial_index=None
+):
     """
     Read a window of an input vector dataset.
 
@@ -135,6 +267,9 @@ def read_vector_window(input_file, tile, validity_check=True):
     validity_check : bool
         checks if reprojected geometry is valid and throws ``RuntimeError`` if
         invalid (default: True)
+    spatial_index : ``VectorFileIndex``
+        if provided, features are queried from this index instead of being
+        read from the file (default: None)
 
     Returns
     -------
@@ -159,13 +294,14 @@ def read_vector_window(input_file, tile, validity_check=True):
         return chain.from_iterable(
             _get_reprojected_features(
                 input_file=input_file, dst_bounds=bbox.bounds, dst_crs=tile.crs,
-                validity_check=validity_check)
+                validity_check=validity_check, spatial_index=spatial_index)
             for bbox in tile_boxes
         )
     else:
         features = _get_reprojected_features(
             input_file=input_file, dst_bounds=tile.bounds,
-            dst_crs=tile.crs, validity_check=validity_check)
+            dst_crs=tile.crs, validity_check=validity_check,
+            spatial_index=spatial_index)
         return features
 
 
@@ -176,7 +312,8 @@ def write_vector_window(in_tile, out_schema, out_tile, out_path):
     Parameters
     ----------
     in_tile : ``BufferedTile``
-        input tile including data
+        input tile including data; feature geometries can either be
+        GeoJSON-like mappings or shapely geometries
     out_schema : dictionary
         output schema for fiona
     out_tile : ``BufferedTile``
@@ -191,9 +328,25 @@ def write_vector_window(in_tile, out_schema, out_tile, out_path):
     if not in_tile.data:
         return
     out_features = []
+    left, bottom, right, top = out_tile.bounds
     for feature in in_tile.data:
-        feature_geom = shape(feature["geometry"])
-        clipped = feature_geom.intersection(out_tile.bbox)
+        feature_geom = feature["geometry"]
+        if not isinstance(feature_geom, BaseGeometry):
+            feature_geom = shape(feature_geom)
+        f_left, f_bottom, f_right, f_top = feature_geom.bounds
+        # skip features outside of tile and only clip features on tile edge
+        if (
+            f_left > right or f_right < left or
+            f_bottom > top or f_top < bottom
+        ):
+            continue
+        elif (
+            f_left >= left and f_right <= right and
+            f_bottom >= bottom and f_top <= top
+        ):
+            clipped = feature_geom
+        else:
+            clipped = feature_geom.intersection(out_tile.bbox)
         out_geom = clipped
         target_type = out_schema["geometry"]
         if clipped.geom_type != target_type:
@@ -219,52 +372,157 @@ def write_vector_window(in_tile, out_schema, out_tile, out_path):
             dst.write(feature)
 
 
+class VectorFileIndex(object):
+    """
+    Spatial index holding all features of a vector file in memory.
+
+    The file is read only once and invalid geometries are fixed while
+    loading. Features intersecting with a bounding box can then be queried
+    from an ``STRtree`` instead of scanning the file.
+
+    Parameters
+    ----------
+    input_file : string
+        path to vector file
+
+    Attributes
+    ----------
+    crs : ``rasterio.crs.CRS``
+        CRS of vector file
+    """
+
+    def __init__(self, input_file):
+        """Initialize."""
+        with fiona.open(input_file, 'r') as vector:
+            self.crs = CRS(vector.crs)
+            features = list(_valid_features(vector))
+        # STRtree returns the indexed geometry objects themselves
+        self._features = dict(
+            (id(geometry), (position, geometry, properties))
+            for position, (geometry, properties) in enumerate(features))
+        self._tree = STRtree([geometry for geometry, _ in features])
+
+    def query(self, geometry):
+        """
+        Return features whose bounding boxes intersect with geometry.
+
+        Parameters
+        ----------
+        geometry : ``shapely.geometry``
+            in index CRS
+
+        Returns
+        -------
+        features : list
+            list of (geometry, properties) tuples in file order
+        """
+        return [
+            (geometry, properties)
+            for _, geometry, properties in sorted(
+                self._features[id(candidate)]
+                for candidate in self._tree.query(geometry))
+        ]
+
+
 def _get_reprojected_features(
-    input_file=None, dst_bounds=None, dst_crs=None, validity_check=None
+    input_file=None, dst_bounds=None, dst_crs=None, validity_check=None,
+    spatial_index=None
 ):
     assert isinstance(input_file, str)
     assert isinstance(dst_bounds, tuple)
     assert isinstance(dst_crs, CRS)
     assert isinstance(validity_check, bool)
 
-    with fiona.open(input_file, 'r') as vector:
-        vector_crs = CRS(vector.crs)
-        # Reproject tile bounding box to source file CRS for filter:
-        if vector_crs == dst_crs:
-            dst_bbox = box(*dst_bounds)
-        else:
-            dst_bbox = reproject_geometry(
-                box(*dst_bounds), src_crs=dst_crs, dst_crs=vector_crs,
-                validity_check=True)
-        for feature in vector.filter(bbox=dst_bbox.bounds):
-            feature_geom = shape(feature['geometry'])
-            if not feature_geom.is_valid:
-                try:
-                    feature_geom = feature_geom.buffer(0)
-                    assert feature_geom.is_valid
-                    # warnings.warn("fixed invalid vector input geometry")
-                except AssertionError:
-                    warnings.warn(
-                        "irreparable geometry found in vector input file"
-                        )
-                    continue
-            geom = clean_geometry_type(
-                feature_geom.intersection(dst_bbox), feature_geom.geom_type)
-            if geom:
-                # Reproject each feature to tile CRS
-                if vector_crs == dst_crs and validity_check:
-                    assert geom.is_valid
-                else:
-                    try:
-                        geom = reproject_geometry(
-                            geom, src_crs=vector_crs, dst_crs=dst_crs,
-                            validity_check=validity_check)
-                    except ValueError:
-                        warnings.warn("feature reprojection failed")
-                yield {
-                    'properties': feature['properties'],
-                    'geometry': mapping(geom)
-                }
+    if spatial_index is not None:
+        vector_crs = spatial_index.crs
+        dst_bbox = _bbox_in_crs(dst_bounds, dst_crs, vector_crs)
+        for feature in _clip_and_reproject(
+            spatial_index.query(dst_bbox), dst_bbox, vector_crs, dst_crs,
+            validity_check
+        ):
+            yield feature
+    else:
+        with fiona.open(input_file, 'r') as vector:
+            vector_crs = CRS(vector.crs)
+            dst_bbox = _bbox_in_crs(dst_bounds, dst_crs, vector_crs)
+            for feature in _clip_and_reproject(
+                _valid_features(vector.filter(bbox=dst_bbox.bounds)),
+                dst_bbox, vector_crs, dst_crs, validity_check
+            ):
+                yield feature
+
+
+def _bbox_in_crs(bounds, bounds_crs, crs):
+    """Return bounds as box geometry reprojected to CRS."""
+    if bounds_crs == crs:
+        return box(*bounds)
+    else:
+        return reproject_geometry(
+            box(*bounds), src_crs=bounds_crs, dst_crs=crs,
+            validity_check=True)
+
+
+def _valid_features(features):
+    """Yield (geometry, properties) tuples and fix invalid geometries."""
+    for feature in features:
+        feature_geom = shape(feature['geometry'])
+        if not feature_geom.is_valid:
+            try:
+                feature_geom = feature_geom.buffer(0)
+                assert feature_geom.is_valid
+                # warnings.warn("fixed invalid vector input geometry")
+            except AssertionError:
+                warnings.warn(
+                    "irreparable geometry found in vector input file"
+                    )
+                continue
+        yield feature_geom, feature['properties']
+
+
+def _clip_and_reproject(
+    features, dst_bbox, vector_crs, dst_crs, validity_check
+):
+    """Clip features to bounding box and reproject them to target CRS."""
+    clipped = []
+    for feature_geom, properties in features:
+        geom = clean_geometry_type(
+            feature_geom.intersection(dst_bbox), feature_geom.geom_type)
+        if geom:
+            clipped.append((geom, properties))
+    if not clipped:
+        return []
+    geoms, properties = zip(*clipped)
+    # Reproject all features to tile CRS at once
+    if vector_crs == dst_crs and validity_check:
+        assert all(geom.is_valid for geom in geoms)
+    else:
+        try:
+            geoms = reproject_geometries(
+                geoms, src_crs=vector_crs, dst_crs=dst_crs,
+                validity_check=validity_check)
+        except ValueError:
+            geoms = [
+                _reproject_feature_geom(
+                    geom, vector_crs, dst_crs, validity_check)
+                for geom in geoms
+            ]
+    return [
+        {
+            'properties': feature_properties,
+            'geometry': mapping(geom)
+        }
+        for geom, feature_properties in zip(geoms, properties)
+    ]
+
+
+def _reproject_feature_geom(geom, vector_crs, dst_crs, validity_check):
+    try:
+        return reproject_geometry(
+            geom, src_crs=vector_crs, dst_crs=dst_crs,
+            validity_check=validity_check)
+    except ValueError:
+        warnings.warn("feature reprojection failed")
+        return geom
 
 
 def clean_geometry_type(geometry, target_type, allow_multipart=True):
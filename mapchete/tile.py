@@ -1,6 +1,36 @@
 """Mapchtete handling tiles."""
-from tilematrix import Tile, TilePyramid
+import math
+import numpy as np
+from collections import namedtuple
+from affine import Affine
+from rasterio.features import rasterize
+from tilematrix import Tile, TilePyramid, clip_geometry_to_srs_bounds
 from cached_property import cached_property
+from shapely.prepared import prep
+
+# maximum number of tile matrix rows rasterized at once
+RASTERIZE_ROWS = 1024
+
+
+class TileIndex(namedtuple("TileIndex", "zoom row col")):
+    """
+    Lightweight tile identifier.
+
+    Other than ``BufferedTile`` it does not carry any geometry or data and is
+    therefore cheap to create, store and send to workers. Use
+    ``BufferedTilePyramid.tile_from_index()`` to get the full tile.
+
+    Attributes
+    ----------
+    zoom : integer
+        zoom level
+    row : integer
+        tile matrix row
+    col : integer
+        tile matrix column
+    """
+
+    __slots__ = ()
 
 
 class BufferedTilePyramid(TilePyramid):
@@ -53,6 +83,21 @@ class BufferedTilePyramid(TilePyramid):
         tile = self.tile_pyramid.tile(zoom, row, col)
         return BufferedTile(tile, pixelbuffer=self.pixelbuffer)
 
+    def tile_from_index(self, tile_index):
+        """
+        Return ``BufferedTile`` object from a tile index.
+
+        Parameters
+        ----------
+        tile_index : ``TileIndex`` or tuple
+            zoom, row and col of tile
+
+        Returns
+        -------
+        buffered tile : ``BufferedTile``
+        """
+        return self.tile(*tile_index)
+
     def tiles_from_bounds(self, bounds, zoom):
         """
         Return all tiles intersecting with bounds.
@@ -110,6 +155,93 @@ class BufferedTilePyramid(TilePyramid):
         for tile in self.tile_pyramid.tiles_from_geom(geometry, zoom):
             yield self.tile(*tile.id)
 
+    def tile_indexes_from_geom(self, geometry, zoom):
+        """
+        Return row and column indexes of all tiles intersecting with geometry.
+
+        Instead of creating every tile and checking its intersection, the
+        geometry is rasterized onto the tile matrix where one pixel represents
+        one tile. Only tiles around the geometry boundary are checked for
+        intersection, so the result matches ``tiles_from_geom()``, including
+        tiles only touching the geometry.
+
+        Parameters
+        ----------
+        geometry : ``shapely.geometry``
+        zoom : integer
+            zoom level
+
+        Returns
+        -------
+        rows, cols : tuple
+            ``numpy`` arrays of tile matrix rows and columns
+        """
+        self._check_zoom(zoom)
+        if not geometry.is_valid:
+            geometry = geometry.buffer(0.0)
+            if not geometry.is_valid:
+                raise IOError("invalid geometry could not be fixed")
+        parts = [
+            part
+            for part in clip_geometry_to_srs_bounds(
+                geometry, self.tile_pyramid, multipart=True)
+            if not part.is_empty]
+        if not parts:
+            return np.array([], dtype="int64"), np.array([], dtype="int64")
+        tile_x_size = self.tile_x_size(zoom)
+        tile_y_size = self.tile_y_size(zoom)
+        left = min(part.bounds[0] for part in parts)
+        bottom = min(part.bounds[1] for part in parts)
+        right = max(part.bounds[2] for part in parts)
+        top = max(part.bounds[3] for part in parts)
+        # tile matrix window covering the geometry
+        col_min = max(int(math.floor((left - self.left) / tile_x_size)), 0)
+        col_max = min(
+            int(math.ceil((right - self.left) / tile_x_size)),
+            self.matrix_width(zoom))
+        row_min = max(int(math.floor((self.top - top) / tile_y_size)), 0)
+        row_max = min(
+            int(math.ceil((self.top - bottom) / tile_y_size)),
+            self.matrix_height(zoom))
+        # point geometries and geometries on tile boundaries
+        col_max = max(col_max, col_min + 1)
+        row_max = max(row_max, row_min + 1)
+        if len(parts) == 1 and parts[0].equals(parts[0].envelope):
+            # rectangles cover all tiles of the window
+            rows, cols = np.mgrid[row_min:row_max, col_min:col_max]
+            return rows.ravel(), cols.ravel()
+        prepared_parts = [prep(part) for part in parts]
+        rows, cols = [], []
+        for strip_min in range(row_min, row_max, RASTERIZE_ROWS):
+            strip_max = min(strip_min + RASTERIZE_ROWS, row_max)
+            # rasterize one more row on both sides to find neighbor tiles
+            top_row = max(strip_min - 1, row_min)
+            bottom_row = min(strip_max + 1, row_max)
+            rasterize_kwargs = dict(
+                out_shape=(bottom_row - top_row, col_max - col_min),
+                transform=Affine(
+                    tile_x_size, 0, self.left + col_min * tile_x_size,
+                    0, -tile_y_size, self.top - top_row * tile_y_size),
+                dtype="uint8")
+            strip = slice(strip_min - top_row, strip_max - top_row)
+            # tiles whose center is within the geometry
+            inside = rasterize(
+                parts, all_touched=False, **rasterize_kwargs
+            ).astype(bool)[strip]
+            # tiles next to touched tiles could touch the geometry as well
+            candidates = _with_neighbors(rasterize(
+                parts, all_touched=True, **rasterize_kwargs
+            ).astype(bool))[strip] & ~inside
+            for row, col in zip(*np.nonzero(candidates)):
+                tile_bbox = self.tile_pyramid.tile(
+                    zoom, row + strip_min, col + col_min).bbox()
+                if any(part.intersects(tile_bbox) for part in prepared_parts):
+                    inside[row, col] = True
+            strip_rows, strip_cols = np.nonzero(inside)
+            rows.append(strip_rows + strip_min)
+            cols.append(strip_cols + col_min)
+        return np.concatenate(rows), np.concatenate(cols)
+
     def intersecting(self, tile):
         """
         Return all BufferedTiles intersecting with tile.
@@ -120,8 +252,8 @@ class BufferedTilePyramid(TilePyramid):
             another tile
         """
         return [
-            self.tile(*intersecting_tile.id)
-            for intersecting_tile in self.tile_pyramid.intersecting(tile)
+            self.tile(*tile_index)
+            for tile_index in intersecting_tile_indexes(tile, self)
         ]
 
 
@@ -233,3 +365,59 @@ class BufferedTile(Tile):
         parent : ``BufferedTile``
         """
         return BufferedTile(self._tile.get_parent(), self.pixelbuffer)
+
+
+def _with_neighbors(cells):
+    """Add all eight neighbors of set cells of a boolean array."""
+    rows = cells.copy()
+    rows[1:] |= cells[:-1]
+    rows[:-1] |= cells[1:]
+    neighbors = rows.copy()
+    neighbors[:, 1:] |= rows[:, :-1]
+    neighbors[:, :-1] |= rows[:, 1:]
+    return neighbors
+
+
+def intersecting_tile_indexes(tile, tile_pyramid, source_pyramid=None):
+    """
+    Return indexes of all tiles from a tile pyramid intersecting with tile.
+
+    As both tile pyramids only differ in their metatiling, the intersecting
+    tiles are calculated from the tile index alone without creating any tile
+    objects in between. Tiles outside of the tile matrix are omitted.
+
+    Parameters
+    ----------
+    tile : ``Tile``, ``BufferedTile`` or ``TileIndex``
+        a tile index requires source_pyramid to be given
+    tile_pyramid : ``TilePyramid`` or ``BufferedTilePyramid``
+    source_pyramid : ``TilePyramid`` or ``BufferedTilePyramid``
+        tile pyramid tile belongs to (default: the one of tile)
+
+    Returns
+    -------
+    tile indexes : list
+        list of ``TileIndex`` objects
+    """
+    if source_pyramid is None:
+        source_pyramid = tile.tile_pyramid
+        tile = tile.id
+    if source_pyramid.type != tile_pyramid.type:
+        raise ValueError("tile and tile pyramid types do not match")
+    zoom, row, col = tile
+    tile_metatiling = source_pyramid.metatiling
+    metatiling = tile_pyramid.metatiling
+    if tile_metatiling == metatiling:
+        return [TileIndex(zoom, row, col)]
+    elif tile_metatiling > metatiling:
+        factor = tile_metatiling // metatiling
+        rows = range(
+            row * factor,
+            min((row + 1) * factor, tile_pyramid.matrix_height(zoom)))
+        cols = range(
+            col * factor,
+            min((col + 1) * factor, tile_pyramid.matrix_width(zoom)))
+        return [TileIndex(zoom, row, col) for row in rows for col in cols]
+    else:
+        factor = metatiling // tile_metatiling
+        return [TileIndex(zoom, row // factor, col // factor)]
@@ -2,10 +2,19 @@
 """Test Mapchete main module and processing."""
 
 import os
+import time
 import yaml
 import shutil
+import signal
+import threading
+from multiprocessing.pool import Pool, MaybeEncodingError
 
+from mapchete import Mapchete
+from mapchete.config import MapcheteConfig
+from mapchete.cli import execute
 from mapchete.cli.main import MapcheteCLI
+from mapchete.io import raster
+from mapchete.tile import TileIndex
 
 scriptdir = os.path.dirname(os.path.realpath(__file__))
 out_dir = os.path.join(scriptdir, "testdata/tmp")
@@ -102,5 +111,212 @@ def test_execute_multiprocessing():
             pass
 
 
+def test_process_tiles_dependencies():
+    """Process tiles after the tiles they are interpolated from."""
+    with open(
+        os.path.join(scriptdir, "testdata/cleantopo_br.mapchete"), "r"
+    ) as config_file:
+        config = yaml.load(config_file)
+    config.update(
+        config_dir=os.path.join(scriptdir, "testdata"), metatiling=1,
+        process_maxzoom=6, baselevels=dict(min=3, max=4))
+    process = Mapchete(MapcheteConfig(config, mode="overwrite"))
+    # tiles below baselevels depend on their children, above on their parent
+    assert execute._tile_dependencies(process, TileIndex(2, 1, 3)) == [
+        (3, 2, 6), (3, 2, 7), (3, 3, 6), (3, 3, 7)]
+    assert execute._tile_dependencies(process, TileIndex(5, 7, 9)) == [
+        (4, 3, 4)]
+    assert execute._tile_dependencies(process, TileIndex(3, 1, 3)) == []
+    zoom_levels = range(6, -1, -1)
+    expected = set()
+    for zoom in zoom_levels:
+        expected.update(process.get_process_tile_indexes(zoom))
+    pools = []
+
+    class _Pool(Pool):
+        def __init__(self, *args):
+            pools.append(self)
+            Pool.__init__(self, *args)
+
+    execute.Pool = _Pool
+    try:
+        processed = [
+            process_info.tile_id
+            for process_info in execute._process_tiles(
+                process, zoom_levels, 2)]
+    finally:
+        execute.Pool = Pool
+        shutil.rmtree(out_dir, ignore_errors=True)
+    # one pool processes all zoom levels
+    assert len(pools) == 1
+    assert len(processed) == len(expected)
+    assert set(processed) == expected
+    position = dict(
+        (tile_id, order) for order, tile_id in enumerate(processed))
+    checked = 0
+    for tile_id in processed:
+        for dependency in execute._tile_dependencies(
+            process, TileIndex(*tile_id)
+        ):
+            if dependency in position:
+                assert position[dependency] < position[tile_id]
+                checked += 1
+    assert checked
+
+
+def test_process_tiles_baselevels_overwrite():
+    """Interpolate from tiles written by other processes in overwrite mode."""
+    with open(
+        os.path.join(scriptdir, "testdata/cleantopo_br.mapchete"), "r"
+    ) as config_file:
+        config = yaml.load(config_file)
+    config.update(
+        config_dir=os.path.join(scriptdir, "testdata"), metatiling=1,
+        process_maxzoom=6, baselevels=dict(min=6, max=6))
+    process = Mapchete(MapcheteConfig(config, mode="overwrite"))
+    baselevel_tiles = set(process.get_process_tile_indexes(6))
+    tile_indexes = [
+        tile_index
+        for tile_index in process.get_process_tile_indexes(5)
+        if set(execute._tile_dependencies(process, tile_index)) &
+        baselevel_tiles][:2]
+    assert len(tile_indexes) == 2
+    pool = Pool(1, execute._worker_init, (process, ))
+    try:
+        for tile_index in tile_indexes:
+            # baselevel tiles are written by this process while the worker
+            # has already looked at the baselevel of the previous tile
+            for dependency in execute._tile_dependencies(process, tile_index):
+                if dependency in baselevel_tiles:
+                    execute._process_worker(
+                        process,
+                        process.config.process_pyramid.tile_from_index(
+                            dependency))
+            (_, process_info, error), = pool.apply(
+                execute._dependency_worker, ([tile_index], ))
+            assert not error
+            output = process.config.output.read(
+                process.config.output_pyramid.tile_from_index(tile_index))
+            assert not output.data.mask.all()
+    finally:
+        pool.close()
+        pool.join()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def test_worker_init():
+    """Apply per worker settings when a worker starts."""
+    with open(
+        os.path.join(scriptdir, "testdata/cleantopo_br.mapchete"), "r"
+    ) as config_file:
+        config = yaml.load(config_file)
+    config.update(
+        config_dir=os.path.join(scriptdir, "testdata"), read_threads=2,
+        dataset_pool_size=4)
+    process = Mapchete(MapcheteConfig(config))
+    try:
+        execute._worker_init(process)
+        assert execute._WORKER_PROCESS is process
+        assert raster.READ_POOL.size == 2
+        assert raster.DATASET_POOL.maxsize == 4
+    finally:
+        execute._WORKER_PROCESS = None
+        raster.READ_POOL.size = 1
+        raster.DATASET_POOL.maxsize = 16
+
+
+def test_log_zoom_progress():
+    """Log progress periodically and when a zoom level is finished."""
+    messages = []
+
+    def _info(msg, *args):
+        messages.append(msg % args)
+
+    info = execute.LOGGER.info
+    execute.LOGGER.info = _info
+    try:
+        start = time.time()
+        stats = dict(total=3, finished=0, start=start, logged=start)
+        execute._log_zoom_progress(5, stats)
+        assert not messages
+        stats["logged"] -= execute.PROGRESS_INTERVAL
+        execute._log_zoom_progress(5, stats)
+        assert len(messages) == 1
+        assert messages[0].startswith("zoom 5: 2 of 3 tile(s) processed")
+        # no further progress until the interval has passed again
+        stats["total"] = 4
+        execute._log_zoom_progress(5, stats)
+        assert len(messages) == 1
+        execute._log_zoom_progress(5, stats)
+        assert len(messages) == 2
+        assert messages[1].startswith("zoom 5: 4 tile(s) processed")
+    finally:
+        execute.LOGGER.info = info
+
+
+def _raising_worker(process, process_tile):
+    raise ValueError("worker failed")
+
+
+def _exiting_worker(process, process_tile):
+    raise SystemExit("worker exited")
+
+
+def _unpicklable_worker(process, process_tile):
+    return execute.ProcessInfo(process_tile.id, "error", lambda: None)
+
+
+def _sleeping_worker(process, process_tile):
+    time.sleep(30)
+
+
+def test_process_tiles_worker_error():
+    """Raise worker errors instead of waiting for the tile forever."""
+    process = Mapchete(
+        MapcheteConfig(
+            os.path.join(scriptdir, "testdata/cleantopo_br.mapchete"),
+            mode="overwrite"))
+    process_worker = execute._process_worker
+    try:
+        for worker, error in [
+            (_raising_worker, RuntimeError), (_exiting_worker, RuntimeError),
+            (_unpicklable_worker, MaybeEncodingError)
+        ]:
+            # workers are forked and use the replaced function
+            execute._process_worker = worker
+            try:
+                list(execute._process_tiles(process, [5, 4], 2))
+                raise AssertionError("worker error not raised")
+            except error:
+                pass
+    finally:
+        execute._process_worker = process_worker
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def test_process_tiles_keyboard_interrupt():
+    """Terminate workers on KeyboardInterrupt."""
+    process = Mapchete(
+        MapcheteConfig(
+            os.path.join(scriptdir, "testdata/cleantopo_br.mapchete"),
+            mode="overwrite"))
+    process_worker = execute._process_worker
+    interrupt = threading.Timer(1, os.kill, (os.getpid(), signal.SIGINT))
+    start = time.time()
+    try:
+        execute._process_worker = _sleeping_worker
+        interrupt.start()
+        list(execute._process_tiles(process, [5], 2))
+        raise AssertionError("KeyboardInterrupt not raised")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        interrupt.cancel()
+        execute._process_worker = process_worker
+        shutil.rmtree(out_dir, ignore_errors=True)
+    # workers are not waited for
+    assert time.time() - start < 10
+
+
 # TODO mapchete serve
 # TODO mapchete pyramid
@@ -2,15 +2,29 @@
 """Test Mapchete io module."""
 
 import os
+import errno
+import shutil
 import rasterio
 import tempfile
+import threading
+from cPickle import dumps, loads
 import numpy as np
 import numpy.ma as ma
-from shapely.geometry import shape
+from affine import Affine
+from rasterio.enums import Resampling
+import pyproj
+from functools import partial
+from multiprocessing import Pool
+from rasterio.crs import CRS
+from shapely.geometry import (
+    shape, box, Point, LineString, Polygon, MultiPoint, MultiLineString,
+    MultiPolygon, GeometryCollection)
+from shapely.ops import transform
 
 from mapchete.config import MapcheteConfig
 from mapchete.tile import BufferedTilePyramid
-from mapchete.io import raster, vector, get_best_zoom_level
+from mapchete.io import (
+    raster, vector, get_best_zoom_level, makedirs, TileDirectoryIndex)
 
 scriptdir = os.path.dirname(os.path.realpath(__file__))
 testdata_directory = os.path.join(scriptdir, "testdata")
@@ -51,6 +65,353 @@ def test_read_raster_window():
         raster.read_raster_window(dummy1, tile, resampling=resampling)
 
 
+def test_read_raster_window_bands():
+    """Read multiple bands at once like single bands."""
+    dummy1 = os.path.join(testdata_directory, "dummy1.tif")
+    with rasterio.open(dummy1) as src:
+        center = box(*src.bounds).centroid
+        src_crs = src.crs
+    for pyramid_type in ["geodetic", "mercator"]:
+        tile_pyramid = BufferedTilePyramid(pyramid_type)
+        tile = tile_pyramid.tiles_from_geom(vector.reproject_geometry(
+            center, src_crs=src_crs, dst_crs=tile_pyramid.crs), 8).next()
+        indexes = [3, 1, 2]
+        bands = list(raster.read_raster_window(dummy1, tile, indexes))
+        assert len(bands) == 3
+        for index, band in zip(indexes, bands):
+            single = raster.read_raster_window(dummy1, tile, index).next()
+            assert not single.mask.all()
+            assert np.array_equal(band.mask, single.mask)
+            assert np.array_equal(band.filled(0), single.filled(0))
+
+
+def test_input_bbox_cache():
+    """Determine input bounding boxes once and keep them when pickled."""
+    for mapchete_file, zoom in [
+        ("minmax_zoom.mapchete", 7), ("geojson.mapchete", 4)
+    ]:
+        config = MapcheteConfig(os.path.join(testdata_directory, mapchete_file))
+        input_data = config.at_zoom(zoom)["input_files"]["file1"]
+        bbox = input_data.bbox()
+        assert input_data.bbox() is bbox
+        assert input_data.prepared_bbox().intersects(bbox.centroid)
+        unpickled = loads(dumps(input_data))
+        assert unpickled.bbox().equals(bbox)
+        assert unpickled.prepared_bbox().intersects(bbox.centroid)
+
+
+def test_dataset_pool():
+    """Reuse open datasets and close them on eviction."""
+    dummy1 = os.path.join(testdata_directory, "dummy1.tif")
+    dummy2 = os.path.join(testdata_directory, "dummy2.tif")
+    pool = raster.RasterDatasetPool(maxsize=1)
+    with pool.open(dummy1) as src:
+        first = src
+    with pool.open(dummy1) as src:
+        assert src is first
+        assert not src.closed
+    with pool.open(dummy2) as src:
+        assert not src.closed
+    assert first.closed
+    pool.close()
+    assert src.closed
+    # changing the size closes datasets and applies to existing threads
+    with pool.open(dummy1) as src:
+        first = src
+    pool.maxsize = 2
+    assert first.closed
+    with pool.open(dummy1) as src:
+        first = src
+    with pool.open(dummy2) as src:
+        assert not first.closed
+    pool.maxsize = 1
+    with pool.open(dummy1) as src:
+        first = src
+    with pool.open(dummy2) as src:
+        assert first.closed
+    pool.close()
+
+
+def test_read_raster_window_warp_options():
+    """Warp raster inputs using multiple threads."""
+    path = os.path.join(testdata_directory, "cleantopo_br.tif")
+    tile = BufferedTilePyramid("mercator", metatiling=2).tile(5, 15, 15)
+    assert raster._warp_kwargs() == dict(num_threads=1)
+    assert raster._warp_kwargs(4, 256) == dict(
+        num_threads=4, warp_mem_limit=256)
+    single_threaded = raster.read_raster_window(path, tile).next()
+    multi_threaded = raster.read_raster_window(
+        path, tile, num_threads=4).next()
+    assert not single_threaded.mask.all()
+    assert np.array_equal(single_threaded, multi_threaded)
+    assert np.array_equal(single_threaded.mask, multi_threaded.mask)
+
+
+def test_read_raster_window_edge():
+    """Read tiles crossing the antimeridian into one array."""
+    path = os.path.join(testdata_directory, "cleantopo_br.tif")
+    tile_pyramid = BufferedTilePyramid("geodetic", pixelbuffer=10)
+    # tile on the western edge reaching over to the data in the east
+    tile = tile_pyramid.tile(5, 31, 0)
+    for indexes in [None, [1]]:
+        bands = list(raster.read_raster_window(path, tile, indexes=indexes))
+        assert len(bands) == 1
+        band = bands[0]
+        assert band.shape == tile.shape
+        assert not band.mask.all()
+        # data is on the left side, within the pixelbuffer
+        assert band.mask[:, 10:].all()
+        east = BufferedTilePyramid("geodetic").tile(5, 31, 63)
+        east_band = raster.read_raster_window(path, east).next()
+        # bottom row tiles are only buffered on top
+        assert np.array_equal(
+            band[10:, :10].filled(0), east_band[:, -10:].filled(0))
+
+
+def test_read_thread_pool():
+    """Run functions in threads and nested calls sequentially."""
+    pool = raster.ReadThreadPool()
+    assert not pool.active
+    assert pool.map(lambda x: x * 2, range(5)) == [0, 2, 4, 6, 8]
+    pool.size = 3
+    assert pool.active
+    threads = pool.map(
+        lambda x: (threading.current_thread().name, pool.active), range(10))
+    # results are returned in order and nested calls are not threaded
+    assert not any(active for _, active in threads)
+    assert all(name != threading.current_thread().name for name, _ in threads)
+    assert pool.map(
+        lambda x: sum(pool.map(lambda y: x * y, range(3))), range(4)
+    ) == [0, 3, 6, 9]
+
+
+def test_read_raster_window_threaded():
+    """Read bands and antimeridian parts concurrently."""
+    path = os.path.join(testdata_directory, "cleantopo_br.tif")
+    tile_pyramid = BufferedTilePyramid("geodetic", pixelbuffer=10)
+    tiles = [tile_pyramid.tile(5, 31, 0), tile_pyramid.tile(5, 31, 63)]
+    sequential = [
+        raster.read_raster_window(path, tile, indexes=[1, 1]).next()
+        for tile in tiles]
+    try:
+        raster.READ_POOL.size = 2
+        threaded = [
+            raster.read_raster_window(path, tile, indexes=[1, 1]).next()
+            for tile in tiles]
+    finally:
+        raster.READ_POOL.size = 1
+    for sequential_band, threaded_band in zip(sequential, threaded):
+        assert np.array_equal(sequential_band.mask, threaded_band.mask)
+        assert np.array_equal(
+            sequential_band.filled(0), threaded_band.filled(0))
+
+
+def test_warp_buffers():
+    """Reuse released arrays per shape and data type."""
+    arena = raster.BufferArena(maxsize=1024)
+    first = arena.empty((2, 10, 10), "uint8")
+    assert first.shape == (2, 10, 10)
+    assert first.dtype == np.uint8
+    arena.release([first])
+    # other shapes and data types get their own arrays
+    assert arena.empty((2, 10, 10), "uint16") is not first
+    assert arena.empty((10, 20), "uint8") is not first
+    assert arena.empty((2, 10, 10), "uint8") is first
+    # arrays are handed out only once until they are released again
+    assert arena.empty((2, 10, 10), "uint8") is not first
+    # arrays still in use are not reused
+    arena.release([first], keep=[ma.masked_array(first[1])])
+    assert arena.empty((2, 10, 10), "uint8") is not first
+    # arrays beyond maxsize are dropped
+    large = arena.empty((2, 1024), "uint8")
+    arena.release([large])
+    assert arena.empty((2, 1024), "uint8") is not large
+    # read tiles into reused arrays
+    path = os.path.join(testdata_directory, "cleantopo_br.tif")
+    for tile in [
+        BufferedTilePyramid("geodetic").tile(5, 30, 62),
+        # crossing the antimeridian
+        BufferedTilePyramid("geodetic", pixelbuffer=10).tile(5, 31, 63)
+    ]:
+        expected = raster.read_raster_window(path, tile).next()
+        buffers = []
+        band = raster.read_raster_window(path, tile, buffers=buffers).next()
+        assert buffers
+        assert any(np.may_share_memory(band, buffer) for buffer in buffers)
+        assert np.array_equal(band.mask, expected.mask)
+        assert np.array_equal(band.filled(0), expected.filled(0))
+        raster.WARP_BUFFERS.release(buffers)
+        reused = []
+        band = raster.read_raster_window(path, tile, buffers=reused).next()
+        assert all(
+            any(array is buffer for buffer in buffers) for array in reused)
+        assert np.array_equal(band.filled(0), expected.filled(0))
+        raster.WARP_BUFFERS.release(reused)
+
+
+def test_read_raster_window_overviews():
+    """Read from overviews matching the tile resolution."""
+    path = tempfile.NamedTemporaryFile(delete=False, suffix=".tif").name
+    try:
+        shutil.copy(os.path.join(testdata_directory, "cleantopo_br.tif"), path)
+        tile = BufferedTilePyramid("geodetic").tile(2, 3, 7)
+        full_resolution = raster.read_raster_window(path, tile).next()
+        raster.DATASET_POOL.close()
+        with rasterio.open(path, "r+") as dst:
+            dst.build_overviews([2, 4, 8], Resampling.nearest)
+        with rasterio.open(path) as src:
+            assert raster._best_overview_factor(
+                src, [1], (295, 325), tile.shape) == 1
+            assert raster._best_overview_factor(
+                src, [1], (1024, 1024), tile.shape) == 4
+        from_overview = raster.read_raster_window(path, tile).next()
+        assert from_overview.shape == full_resolution.shape
+        assert from_overview.any()
+        # overview pixels are coarser, so edges may shift by one pixel
+        assert abs(from_overview.count() - full_resolution.count()) < (
+            0.05 * full_resolution.count())
+        assert abs(from_overview.mean() - full_resolution.mean()) < (
+            0.05 * full_resolution.mean())
+    finally:
+        raster.DATASET_POOL.close()
+        os.remove(path)
+
+
+def test_read_raster_window_from_overview():
+    """Read data from overviews like from the full resolution."""
+    path = tempfile.NamedTemporaryFile(delete=False, suffix=".tif").name
+    try:
+        tile = BufferedTilePyramid("geodetic").tile(2, 1, 3)
+        # 8 by 8 pixel blocks of equal values are the same in all overviews
+        size = tile.width * 8
+        rows, cols = np.indices((size, size)) // 8
+        data = (rows * 255 + cols + 1).astype("uint16")
+        with rasterio.open(
+            path, "w", driver="GTiff", count=1, dtype="uint16", nodata=0,
+            width=size, height=size, crs=tile.crs,
+            transform=tile.affine * Affine.scale(1 / 8.)
+        ) as dst:
+            dst.write(data, 1)
+        full_resolution = raster.read_raster_window(path, tile).next()
+        assert np.array_equal(full_resolution, data[4::8, 4::8])
+        raster.DATASET_POOL.close()
+        with rasterio.open(path, "r+") as dst:
+            dst.build_overviews([2, 4, 8], Resampling.nearest)
+            # overviews keep the original values
+            dst.write(np.ones((size, size), dtype="uint16"), 1)
+        from_overview = raster.read_raster_window(path, tile).next()
+        assert not from_overview.mask.any()
+        assert np.array_equal(from_overview, full_resolution)
+    finally:
+        raster.DATASET_POOL.close()
+        os.remove(path)
+
+
+def test_read_raster_window_aligned():
+    """Read data aligned with the tile grid without reprojecting."""
+    path = tempfile.NamedTemporaryFile(delete=False, suffix=".tif").name
+    try:
+        tile = BufferedTilePyramid("geodetic").tile(8, 50, 300)
+        data = (np.arange(
+            tile.width * tile.height).reshape(tile.shape) % 1000 + 1).astype(
+            "uint16")
+        with rasterio.open(
+            path, "w", driver="GTiff", count=1, dtype="uint16", nodata=0,
+            width=tile.width, height=tile.height, crs=tile.crs,
+            transform=tile.affine
+        ) as dst:
+            dst.write(data, 1)
+        assert raster._aligned_offsets(tile.affine, tile.affine) == (0, 0)
+        shifted = tile.affine * Affine.translation(0.5, 0)
+        assert raster._aligned_offsets(tile.affine, shifted) is None
+        band = raster.read_raster_window(path, tile).next()
+        assert np.array_equal(band, data)
+        assert not band.mask.any()
+        # buffered tile reaches beyond the raster bounds
+        buffered = BufferedTilePyramid("geodetic", pixelbuffer=2).tile(
+            8, 50, 300)
+        band = raster.read_raster_window(path, buffered).next()
+        assert band.shape == buffered.shape
+        assert np.array_equal(band[2:-2, 2:-2], data)
+        assert band.mask[:2].all() and band.mask[-2:].all()
+    finally:
+        raster.DATASET_POOL.close()
+        os.remove(path)
+
+
+def test_makedirs():
+    """Create directories also if another worker creates them meanwhile."""
+    path = tempfile.mkdtemp()
+    os_makedirs = os.makedirs
+    try:
+        directory = os.path.join(path, "5", "5")
+        makedirs(directory)
+        assert os.path.isdir(directory)
+        makedirs(directory)
+
+        def _created_meanwhile(path):
+            os_makedirs(path)
+            raise OSError(errno.EEXIST, "File exists", path)
+
+        os.makedirs = _created_meanwhile
+        makedirs(os.path.join(path, "6"))
+        assert os.path.isdir(os.path.join(path, "6"))
+
+        def _permission_denied(path):
+            raise OSError(errno.EACCES, "Permission denied", path)
+
+        os.makedirs = _permission_denied
+        try:
+            makedirs(os.path.join(path, "7"))
+            raise AssertionError("OSError not raised")
+        except OSError as e:
+            assert e.errno == errno.EACCES
+    finally:
+        os.makedirs = os_makedirs
+        shutil.rmtree(path)
+
+
+def test_tile_directory_index():
+    """Find existing tiles by scanning the output directory."""
+    path = tempfile.mkdtemp()
+    try:
+        tp = BufferedTilePyramid("geodetic")
+        existing = tp.tile(5, 5, 5)
+        makedirs(os.path.join(path, "5", "5"))
+        open(os.path.join(path, "5", "5", "5.tif"), "w").close()
+        index = TileDirectoryIndex(path, ".tif")
+        assert index.exists(existing.id)
+        assert not index.exists((5, 5, 6))
+        assert not index.exists((6, 5, 5))
+        # tiles missing in a lazy listing are checked again
+        open(os.path.join(path, "5", "5", "6.tif"), "w").close()
+        assert index.exists((5, 5, 6))
+        # the scanning process trusts missing tiles without checking files
+        index.scan(5)
+        open(os.path.join(path, "5", "5", "7.tif"), "w").close()
+        assert not index.exists((5, 5, 7))
+        # workers inheriting the index find tiles written by other workers
+        pool = Pool(1)
+        try:
+            assert pool.apply(_tile_exists, (index, (5, 5, 7)))
+        finally:
+            pool.close()
+            pool.join()
+        # tiles written by this process are found after being discarded
+        index.discard((5, 5, 7))
+        assert index.exists((5, 5, 7))
+        # removed tiles are not reported after being discarded
+        os.remove(os.path.join(path, "5", "5", "5.tif"))
+        index.discard(existing.id)
+        assert not index.exists(existing.id)
+    finally:
+        shutil.rmtree(path)
+
+
+def _tile_exists(index, tile_index):
+    return index.exists(tile_index)
+
+
 def test_write_raster_window():
     """Basic output format writing."""
     path = tempfile.NamedTemporaryFile(delete=False).name
@@ -112,10 +473,65 @@ def test_write_raster_window():
             pass
 
 
-# TODO raster.extract_from_tile()
-# TODO raster.extract_from_array()
+def test_extract_from_tile():
+    """Extract output tile windows as views on process tile data."""
+    process_tile = BufferedTilePyramid("geodetic", metatiling=2).tile(5, 5, 5)
+    output_pyramid = BufferedTilePyramid("geodetic")
+    bands = tuple(
+        ma.masked_array(
+            np.arange(process_tile.width * process_tile.height).reshape(
+                process_tile.shape) + band, mask=False)
+        for band in range(2))
+    process_tile.data = raster.prepare_array(bands)
+    assert process_tile.data.shape == (2, ) + process_tile.shape
+    assert process_tile.data.flags["C_CONTIGUOUS"]
+    for output_tile in output_pyramid.intersecting(process_tile):
+        extracted = raster.extract_from_tile(process_tile, output_tile)
+        assert extracted.shape == (2, ) + output_tile.shape
+        assert np.may_share_memory(extracted.data, process_tile.data.data)
+        assert np.may_share_memory(extracted.mask, process_tile.data.mask)
+        row_off = (output_tile.row - process_tile.row * 2) * output_tile.height
+        col_off = (output_tile.col - process_tile.col * 2) * output_tile.width
+        assert extracted[1, 0, 0] == bands[1][row_off, col_off]
+
+
 # TODO raster.resample_from_array()
-# TODO raster.create_mosaic()
+
+
+def test_create_mosaic():
+    """Create mosaic from tiles, optionally into an existing array."""
+    tp = BufferedTilePyramid("geodetic")
+    tiles = tp.tile(5, 5, 5).get_children()
+    for value, tile in enumerate(tiles):
+        tile.data = ma.masked_array(
+            np.full((2, ) + tile.shape, value, dtype="uint8"),
+            mask=np.zeros((2, ) + tile.shape, dtype=bool))
+    # plain arrays get masked by nodata value
+    tiles[0].data = tiles[0].data.data
+    mosaic, affine = raster.create_mosaic(tiles)
+    assert mosaic.shape == (2, tiles[0].height * 2, tiles[0].width * 2)
+    assert mosaic.mask.dtype == bool
+    assert affine == tiles[0].affine
+    for value, tile in enumerate(tiles):
+        assert ma.allclose(
+            raster.extract_from_array(mosaic, affine, tile), value)
+    assert mosaic.mask[:, :tiles[0].height, :tiles[0].width].all()
+    assert not mosaic.mask[:, tiles[0].height:, :].any()
+    out = ma.masked_array(np.zeros(mosaic.shape, dtype="uint8"))
+    out_mosaic, out_affine = raster.create_mosaic(tiles, out=out)
+    assert out_mosaic is out
+    assert out_affine == affine
+    assert ma.allclose(out_mosaic, mosaic)
+    assert np.array_equal(out_mosaic.mask, mosaic.mask)
+    # masked arrays keep their mask and get unmasked nodata pixels masked
+    tiles[1].data.mask[:, 0, :] = True
+    tiles[1].data.data[:, 1, :] = 0
+    mosaic, affine = raster.create_mosaic(tiles)
+    extracted = raster.extract_from_array(mosaic, affine, tiles[1])
+    assert extracted.mask[:, :2, :].all()
+    assert not extracted.mask[:, 2:, :].any()
+    for tile in tiles[2:]:
+        assert not raster.extract_from_array(mosaic, affine, tile).mask.any()
 
 
 def test_read_vector_window():
@@ -136,7 +552,90 @@ def test_read_vector_window():
     assert feature_count
 
 
-# TODO vector.reproject_geometry()
+def test_read_vector_window_spatial_index():
+    """Query vector features from spatial index."""
+    zoom = 4
+    config = MapcheteConfig(
+        os.path.join(scriptdir, "testdata/geojson.mapchete"))
+    vectorfile = config.at_zoom(zoom)["input_files"]["file1"]
+    spatial_index = vectorfile.spatial_index()
+    assert vectorfile.spatial_index() is spatial_index
+    tile_pyramid = BufferedTilePyramid("geodetic", pixelbuffer=5)
+    feature_count = 0
+    for tile in tile_pyramid.tiles_from_geom(vectorfile.bbox(), zoom):
+        from_file = list(vector.read_vector_window(vectorfile.path, tile))
+        from_index = list(vector.read_vector_window(
+            vectorfile.path, tile, spatial_index=spatial_index))
+        assert len(from_file) == len(from_index)
+        for file_feature, index_feature in zip(from_file, from_index):
+            assert file_feature["properties"] == index_feature["properties"]
+            assert shape(file_feature["geometry"]).equals(
+                shape(index_feature["geometry"]))
+        input_tile = vectorfile.open(tile, spatial_index=True)
+        assert len(input_tile.read()) == len(from_file)
+        feature_count += len(from_index)
+    assert feature_count
+    # index is not pickled but rebuilt on demand
+    unpickled = loads(dumps(vectorfile))
+    assert unpickled._spatial_index is None
+    assert unpickled.spatial_index() is not spatial_index
+
+
+def test_reproject_geometry():
+    """Reproject geometries of all types using cached projections."""
+    src_crs = CRS().from_epsg(4326)
+    dst_crs = CRS().from_epsg(32633)
+    project = partial(
+        pyproj.transform, pyproj.Proj(src_crs), pyproj.Proj(dst_crs))
+    polygon = box(0, 0, 10, 10).difference(box(2, 2, 3, 3))
+    for geometry in [
+        Point(1, 2), Point(1, 2, 3), LineString([(0, 0), (1, 1), (2, 0)]),
+        polygon, MultiPoint([(0, 0), (1, 1)]),
+        MultiLineString([[(0, 0), (1, 1)], [(2, 2), (3, 1)]]),
+        MultiPolygon([polygon, box(20, 20, 30, 30)]),
+        GeometryCollection([Point(0, 0), polygon]), Polygon()
+    ]:
+        reprojected = vector.reproject_geometry(geometry, src_crs, dst_crs)
+        expected = transform(project, geometry)
+        assert reprojected.geom_type == expected.geom_type
+        assert reprojected.has_z == expected.has_z
+        assert reprojected.equals_exact(expected, 1e-6) or (
+            reprojected.is_empty and expected.is_empty)
+    # parts outside of CRS bounds get clipped
+    mercator_crs = CRS().from_epsg(3857)
+    clipped = vector.reproject_geometry(
+        box(0, 80, 10, 90), src_crs, mercator_crs)
+    expected = vector.reproject_geometry(
+        box(0, 80, 10, 85.0511), src_crs, mercator_crs)
+    assert clipped.equals(expected)
+
+
+def test_reproject_geometries():
+    """Reproject lists of geometries at once."""
+    src_crs = CRS().from_epsg(4326)
+    polygon = box(0, 0, 10, 10).difference(box(2, 2, 3, 3))
+    geometries = [
+        Point(1, 2), polygon, Polygon(), box(0, 80, 10, 90),
+        MultiPolygon([polygon, box(20, 20, 30, 30)]),
+        LineString([(0, 0), (1, 1), (2, 0)])
+    ]
+    for dst_crs in [CRS().from_epsg(3857), CRS().from_epsg(32633)]:
+        reprojected = vector.reproject_geometries(geometries, src_crs, dst_crs)
+        assert len(reprojected) == len(geometries)
+        for geometry, batch_reprojected in zip(geometries, reprojected):
+            single_reprojected = vector.reproject_geometry(
+                geometry, src_crs, dst_crs)
+            assert batch_reprojected.equals(single_reprojected) or (
+                batch_reprojected.is_empty and single_reprojected.is_empty)
+    assert vector.reproject_geometries([], src_crs, dst_crs) == []
+    try:
+        vector.reproject_geometries(
+            geometries, src_crs, CRS().from_epsg(3857), error_on_clip=True)
+        raise AssertionError("geometry outside CRS bounds not detected")
+    except RuntimeError:
+        pass
+
+
 # TODO vector.write_vector_window()
 # TODO vector.clean_geometry_type()
 # TODO vector.extract_from_tile()
@@ -2,17 +2,23 @@
 """Test Mapchete main module and processing."""
 
 import os
+import time
 import shutil
+import threading
+import yaml
 import rasterio
+import numpy as np
 import numpy.ma as ma
-from cPickle import dumps
+from cPickle import dumps, loads
 from functools import partial
 from multiprocessing import Pool
+from shapely.geometry import Polygon, box
 
-from mapchete import Mapchete
+from mapchete import Mapchete, ProcessTileCache, _load_process_module
 from mapchete.config import MapcheteConfig
-from mapchete.tile import BufferedTile
-from mapchete.io.raster import create_mosaic
+from mapchete.tile import (
+    BufferedTile, BufferedTilePyramid, TileIndex, intersecting_tile_indexes)
+from mapchete.io import raster
 
 scriptdir = os.path.dirname(os.path.realpath(__file__))
 out_dir = os.path.join(scriptdir, "testdata/tmp")
@@ -35,7 +41,7 @@ def test_processing():
                 assert output.data.shape == output.shape
                 assert not ma.all(output.data.mask)
                 process.write(output)
-            mosaic, mosaic_affine = create_mosaic(tiles)
+            mosaic, mosaic_affine = raster.create_mosaic(tiles)
             try:
                 temp_vrt = os.path.join(out_dir, str(zoom)+".vrt")
                 gdalbuildvrt = "gdalbuildvrt %s %s/%s/*/*.tif > /dev/null" % (
@@ -91,6 +97,280 @@ def test_multiprocessing():
             pass
 
 
+def test_skip_existing_tiles():
+    """Don't return process tiles whose output already exists."""
+    process = Mapchete(
+        MapcheteConfig(
+            os.path.join(scriptdir, "testdata/cleantopo_tl.mapchete")))
+    zoom = 3
+    try:
+        tiles = list(process.get_process_tiles(zoom))
+        process.write(process.execute(tiles[0]))
+        remaining = list(process.get_process_tiles(zoom, skip_existing=True))
+        assert len(remaining) == len(tiles) - 1
+        assert tiles[0].id not in [tile.id for tile in remaining]
+        assert process.config.output.tiles_exist_from_index(
+            tiles[0].id, process.config.process_pyramid)
+        assert not process.config.output.tiles_exist_from_index(
+            process.get_process_tile_indexes(zoom + 1).next(),
+            process.config.process_pyramid)
+        # existing output is checked without creating process tiles
+        pyramid = process.config.process_pyramid
+
+        def _tile_from_index(tile_index):
+            raise AssertionError("tile created for %s" % str(tile_index))
+
+        pyramid.tile_from_index = _tile_from_index
+        try:
+            assert len(list(process.get_process_tile_indexes(
+                zoom, skip_existing=True))) == len(tiles) - 1
+        finally:
+            del pyramid.tile_from_index
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def test_tile_indexes_from_geom():
+    """Rasterized tile indexes match intersecting tiles."""
+    tp = BufferedTilePyramid("geodetic")
+    zoom = 6
+    size = tp.tile_x_size(zoom)
+    for geometry in [
+        Polygon([(2.1, 3.3), (15.7, 8.9), (6.4, 21.2)]),
+        box(-185.2, -10.3, -170.1, 5.5),
+        box(10.0, 10.0, 20.0, 20.0),
+        # edges on tile boundaries
+        Polygon([
+            (0, 0), (4 * size, 0), (4 * size, 2 * size), (2 * size, 2 * size),
+            (2 * size, 4 * size), (0, 4 * size)]),
+        Polygon([(0, 0), (4 * size, 0), (0, 4 * size)])
+    ]:
+        rows, cols = tp.tile_indexes_from_geom(geometry, zoom)
+        indexes = set(zip(rows.tolist(), cols.tolist()))
+        assert len(indexes) == len(rows)
+        assert indexes == set(
+            (tile.row, tile.col)
+            for tile in tp.tiles_from_geom(geometry, zoom))
+    # rectangles result in the same tiles
+    geometry = box(10.0, 10.0, 20.0, 20.0)
+    rows, cols = tp.tile_indexes_from_geom(geometry, zoom)
+    assert zip(rows.tolist(), cols.tolist()) == [
+        (tile.row, tile.col) for tile in tp.tiles_from_geom(geometry, zoom)]
+
+
+def test_tile_index():
+    """Use lightweight tile indexes instead of tiles."""
+    process = Mapchete(
+        MapcheteConfig(
+            os.path.join(scriptdir, "testdata/cleantopo_tl.mapchete")))
+    zoom = 3
+    tile_indexes = list(process.get_process_tile_indexes(zoom))
+    assert tile_indexes == [
+        tile.id for tile in process.get_process_tiles(zoom)]
+    tile_index = tile_indexes[0]
+    assert isinstance(tile_index, TileIndex)
+    assert tile_index.zoom == zoom
+    assert len(dumps(tile_index)) < len(
+        dumps(process.config.process_pyramid.tile_from_index(tile_index)))
+    tile = process.config.process_pyramid.tile_from_index(tile_index)
+    assert isinstance(tile, BufferedTile)
+    assert tile.id == tile_index
+
+
+def test_intersecting_tile_indexes():
+    """Determine intersecting tiles from tile indexes."""
+    process_pyramid = BufferedTilePyramid("geodetic", metatiling=8)
+    output_pyramid = BufferedTilePyramid("geodetic", metatiling=2)
+    process_tile = process_pyramid.tile(10, 20, 30)
+    output_tiles = output_pyramid.intersecting(process_tile)
+    assert [tile.id for tile in output_tiles] == [
+        tile.id
+        for tile in output_pyramid.tile_pyramid.intersecting(process_tile)]
+    assert len(output_tiles) == 16
+    for output_tile in output_tiles:
+        assert process_pyramid.intersecting(output_tile)[0].id == (
+            process_tile.id)
+    # metatiles exceeding the tile matrix
+    process_tile = BufferedTilePyramid("geodetic", metatiling=16).tile(0, 0, 0)
+    assert intersecting_tile_indexes(
+        process_tile, BufferedTilePyramid("geodetic")) == [(0, 0, 0), (0, 0, 1)]
+    # tile indexes together with their tile pyramid
+    assert intersecting_tile_indexes(
+        TileIndex(0, 0, 0), BufferedTilePyramid("geodetic"),
+        process_tile.tile_pyramid) == [(0, 0, 0), (0, 0, 1)]
+
+
+def test_process_module_cache():
+    """Import process module only once unless process file changes."""
+    process_file = os.path.join(out_dir, "cached_process.py")
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    try:
+        with open(process_file, "w") as dst:
+            dst.write("VALUE = 1\n")
+        module = _load_process_module("cached_process", process_file)
+        assert module.VALUE == 1
+        assert _load_process_module("cached_process", process_file) is module
+        # same content but new modification time
+        mtime = os.path.getmtime(process_file)
+        os.utime(process_file, (time.time(), mtime + 10))
+        assert _load_process_module("cached_process", process_file) is module
+        # changed content
+        with open(process_file, "w") as dst:
+            dst.write("VALUE = 2\n")
+        os.utime(process_file, (time.time(), mtime + 20))
+        assert _load_process_module("cached_process", process_file).VALUE == 2
+    finally:
+        shutil.rmtree(out_dir)
+
+
+def test_process_tile_cache():
+    """Limit process tile cache by data size."""
+    tp = BufferedTilePyramid("geodetic")
+    # each tile holds 256 * 256 bytes data and 256 * 256 bytes mask
+    cache = ProcessTileCache(maxsize=3 * 2 * 256 * 256)
+    for col in range(4):
+        tile = tp.tile(5, 5, col)
+        tile.data = ma.masked_array(
+            np.ones((1, ) + tile.shape, dtype="uint8"), mask=False)
+        cache[tile.id] = tile
+    assert len(cache) == 3
+    assert cache.evictions == 1
+    assert (5, 5, 0) not in cache
+    assert cache.lookup((5, 5, 3)).data.shape == (1, 256, 256)
+    assert cache.lookup((5, 5, 0)) is None
+    # plain access is not counted
+    assert cache[(5, 5, 3)] is cache.get((5, 5, 3))
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_process_tile_cache_lookups():
+    """Count process tile cache lookups when serving output from memory."""
+    with open(
+        os.path.join(scriptdir, "testdata/cleantopo_br.mapchete"), "r"
+    ) as src:
+        config = yaml.load(src)
+    config.update(config_dir=os.path.join(scriptdir, "testdata"))
+    process = Mapchete(MapcheteConfig(config, mode="memory"))
+    cache = process.process_tile_cache
+    process_tile = process.get_process_tiles(5).next()
+    tile = process.config.output_pyramid.intersecting(process_tile)[0]
+    process.get_raw_output(tile)
+    assert (cache.hits, cache.misses) == (0, 1)
+    process.get_raw_output(tile)
+    assert (cache.hits, cache.misses) == (1, 1)
+    # lookups from several threads are all counted
+    threads = [
+        threading.Thread(target=cache.lookup, args=(process_tile.id, ))
+        for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert (cache.hits, cache.misses) == (9, 1)
+
+
+def test_prefetch_inputs():
+    """Hand inputs read in the background on to the process."""
+    mapchete_file = os.path.join(scriptdir, "testdata/cleantopo_tl.mapchete")
+    with open(mapchete_file, "r") as src:
+        config = yaml.load(src)
+    config.update(
+        config_dir=os.path.join(scriptdir, "testdata"), prefetch_tiles=1)
+    process = Mapchete(MapcheteConfig(mapchete_file))
+    prefetching = Mapchete(MapcheteConfig(config))
+    try:
+        tiles = [
+            tile for zoom in (5, 4, 3)
+            for tile in process.get_process_tiles(zoom)]
+        # all inputs are read with default parameters at first
+        prefetching.prefetch(tiles[0])
+        inputs = prefetching.input_prefetcher.pop(tiles[0])
+        assert [kwargs for kwargs, _ in inputs.values()] == [{}]
+        # prefetching processes can be sent to workers
+        unpickled = loads(dumps(prefetching))
+        assert unpickled.input_prefetcher.maxsize == 1
+        # afterwards inputs are read like the process opened them
+        prefetching.execute(tiles[0])
+        prefetching.prefetch(tiles[1])
+        inputs = prefetching.input_prefetcher.pop(tiles[1])
+        for kwargs, input_tile in inputs.values():
+            assert kwargs == dict(resampling="bilinear")
+            assert input_tile._np_band_cache
+        # only prefetch_tiles tiles are kept
+        prefetching.prefetch(tiles[1])
+        prefetching.prefetch(tiles[2])
+        assert prefetching.input_prefetcher.pop(tiles[1]) == {}
+        prefetched = prefetching.execute(tiles[2]).data
+        assert not prefetching.input_prefetcher.pop(tiles[2])
+        expected = process.execute(tiles[2]).data
+        assert np.array_equal(prefetched.mask, expected.mask)
+        assert np.array_equal(prefetched.filled(0), expected.filled(0))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def test_release_input_buffers():
+    """Reuse arrays of read inputs for other tiles but keep process output."""
+    with open(
+        os.path.join(scriptdir, "testdata/cleantopo_br.mapchete"), "r"
+    ) as src:
+        config = yaml.load(src)
+    config.update(config_dir=os.path.join(scriptdir, "testdata"), metatiling=1)
+    process = Mapchete(MapcheteConfig(config))
+    released = []
+
+    def _release(arrays, keep=None):
+        released.extend(arrays)
+        release(arrays, keep=keep)
+
+    release = raster.WARP_BUFFERS.release
+    raster.WARP_BUFFERS.release = _release
+    try:
+        first, second = list(process.get_process_tiles(5))[:2]
+        output = process.execute(first).data
+        expected = output.copy()
+        assert released
+        assert not any(
+            np.may_share_memory(array, output.data) or
+            np.may_share_memory(array, output.mask)
+            for array in released)
+        # reusing the arrays does not change output of other tiles
+        process.execute(second)
+        assert np.array_equal(output.mask, expected.mask)
+        assert np.array_equal(output.filled(0), expected.filled(0))
+    finally:
+        raster.WARP_BUFFERS.release = release
+
+
+def test_process_settings():
+    """Pass on settings of each process instead of changing global ones."""
+    with open(
+        os.path.join(scriptdir, "testdata/cleantopo_br.mapchete"), "r"
+    ) as src:
+        config = yaml.load(src)
+    config.update(config_dir=os.path.join(scriptdir, "testdata"))
+    default = Mapchete(MapcheteConfig(dict(config)))
+    config.update(
+        warp_num_threads=2, warp_mem_limit=64, read_threads=2,
+        dataset_pool_size=4)
+    configured = Mapchete(MapcheteConfig(config))
+    assert raster.WARP_DEFAULTS == dict(num_threads=1, warp_mem_limit=0)
+    assert raster.READ_POOL.size == 1
+    assert raster.DATASET_POOL.maxsize == 16
+    tile = default.get_process_tiles(5).next()
+    for process, num_threads, warp_mem_limit in [
+        (default, 1, 0), (configured, 2, 64)
+    ]:
+        input_file = process.config.at_zoom(5)["input_files"]["file1"]
+        input_tile = input_file.open(tile)
+        assert input_tile.num_threads == num_threads
+        assert input_tile.warp_mem_limit == warp_mem_limit
+        # settings passed when opening an input are kept
+        assert input_file.open(tile, num_threads=3).num_threads == 3
+
+
 def _worker(process, process_tile):
     """Multiprocessing worker processing a tile."""
     return process.execute(process_tile)